@@ -1,41 +1,94 @@
-from typing import List
+from typing import Callable, List
 from xmlrpc.server import SimpleXMLRPCServer
+import functools
 import logging
+import socketserver
 import threading
 import time
 
 from grue.base.pool import Pool
-from grue.base.state import State
+from grue.base.state import STATES_LOWER, Booting, ShuttingDown
 
 
 logger = logging.getLogger(__name__)
 
 
+class PooledXMLRPCServer(socketserver.ThreadingMixIn, SimpleXMLRPCServer):
+    """Serve each XMLRPC request in its own daemon thread.
+
+    The stock SimpleXMLRPCServer handles one request at a time, so a slow
+    command (e.g. reload, or change_state waiting on a running cycle)
+    blocks every other client for its full duration."""
+    daemon_threads = True
+
+
 class Cycle(threading.Thread):
     n_cycle: int = 0
 
     def __init__(
             self, interval: int, pool: Pool, monitor: threading.Event):
         self.interval = interval
+        self._interval = interval
         self.pool = pool
         self.monitor = monitor
         self.stopped = threading.Event()
         threading.Thread.__init__(self, target=self.run)
 
-    def decision(self):
+    def adapt_interval(self, actions: int) -> float:
+        """Back off polling while nothing in the pool is changing.
+
+        An idle pool does not need a full BMC sweep every interval, so the
+        effective interval grows by half for every cycle without power
+        actions (up to eight base intervals). It snaps back to the base
+        interval as soon as an action is taken or a machine is in a
+        transient state (Booting, ShuttingDown)."""
+        transient = any(
+            isinstance(m.state, (Booting, ShuttingDown))
+            for m in self.pool.machines)
+
+        if actions or transient:
+            self._interval = self.interval
+        else:
+            self._interval = min(self._interval * 1.5, 8 * self.interval)
+
+        if self._interval != self.interval:
+            logger.debug(f'Pool is idle; next cycle in {self._interval:.0f}s')
+
+        return self._interval
+
+    def decision(self) -> int:
         """Execute the decision-making process"""
         self.monitor.clear()
         self.n_cycle += 1
         logger.info(f'Initiating cycle #{self.n_cycle}')
-        self.pool.decide()
+        actions = self.pool.decide()
         self.monitor.set()
+        return actions
 
     def run(self):
         """Continuously cycle through the decision-making process at an
-        interval"""
-        self.decision()
-        while not self.stopped.wait(self.interval):
-            self.decision()
+        interval.
+
+        Waiting a fixed interval between decisions stretches the effective
+        period to interval plus decision time, drifting further as cycles
+        get slower. Scheduling against a monotonic deadline keeps cycles on
+        cadence without a catch-up storm when a decision overruns."""
+        interval = self.adapt_interval(self.decision())
+        deadline = time.monotonic() + interval
+
+        while True:
+            delta = deadline - time.monotonic()
+
+            if delta < 0:
+                logger.warning(f'Cycle overran by {-delta:.1f}s')
+                deadline = time.monotonic()
+                delta = 0
+
+            if self.stopped.wait(delta):
+                break
+
+            interval = self.adapt_interval(self.decision())
+            deadline += interval
 
     def start(self):
         super().start()
@@ -57,15 +110,50 @@ class GrueDaemon(threading.Thread):
         self.pool = pool
         self.monitor = threading.Event()
         self.monitor.set()
+        self.request_limit = threading.BoundedSemaphore(8)
+        self.pool_lock = threading.Lock()
         threading.Thread.__init__(self, target=self.run, daemon=True)
 
+    def _limit(self, f: Callable) -> Callable:
+        """Bound how many XMLRPC requests are handled concurrently"""
+        @functools.wraps(f)
+        def limit_wrapper(*args, **kwargs):
+            with self.request_limit:
+                return f(*args, **kwargs)
+        return limit_wrapper
+
+    def batch(self, commands: List) -> List:
+        """Execute a list of (command, args) pairs in a single round-trip.
+
+        Clients driving many machines otherwise pay one TCP+XMLRPC
+        round-trip per command. Waiting on the cycle monitor once up front
+        means the sub-commands do not each block on a running cycle."""
+        logger.debug(f'Received command batch of {len(commands)} commands')
+        dispatch = {
+            'change_state': self.change_state,
+            'get_status': self.get_status,
+            'reload': self.reload}
+        results = []
+
+        # Wait for a cycle to finish if one is currently running
+        self.monitor.wait()
+
+        for command, args in commands:
+            if command not in dispatch.keys():
+                results.append([f'Unknown command: {command}'])
+                logger.debug(f'Unknown command: {command}')
+                continue
+
+            results.append(dispatch[command](*args))
+
+        return results
+
     def change_state(self, new_state: str, machines: List[str]) -> List[str]:
         logger.debug(
             f'Received command: grue state {new_state} {" ".join(machines)}')
         status = []
         new_state = new_state.lower()
-        states = {state.__name__: state for state in State.__subclasses__()}
-        states = {k.lower(): v for k, v in states.items()}
+        states = STATES_LOWER
 
         if new_state not in states.keys():
             status.append(f'Unknown state: {new_state}')
@@ -75,36 +163,46 @@ class GrueDaemon(threading.Thread):
         # Wait for a cycle to finish if one is currently running
         self.monitor.wait()
 
-        for machine in machines:
-            if machine in self.pool.machine.keys():
-                self.pool.machine[machine].transition_to(states[new_state]())
-                status.append(
-                    f'Transition {machine} to {states[new_state].__name__}')
-            else:
-                status.append(f'Machine {machine} does not exist')
-                logger.debug(f'Machine {machine} does not exist')
+        with self.pool_lock:
+            machine_by_name = self.pool.machine
+            for machine in machines:
+                if machine in machine_by_name.keys():
+                    machine_by_name[machine].transition_to(
+                        states[new_state]())
+                    status.append(
+                        f'Transition {machine} to '
+                        f'{states[new_state].__name__}')
+                else:
+                    status.append(f'Machine {machine} does not exist')
+                    logger.debug(f'Machine {machine} does not exist')
 
         return status
 
     def get_status(self):
         logger.debug('Received command: grue status')
+        now = int(time.time())
         return [
-            [m.name, m.state.__name__(), str(len(m)), m.timer,
-             f'{int(time.time())-m.last_active}s']
+            [m.name, m.state.STATE_NAME, str(len(m)), m.timer,
+             f'{now-m.last_active}s']
             for m in self.pool.machines]
 
     def reload(self, manifest_file: str):
-        self.pool.reload(manifest_file)
+        with self.pool_lock:
+            self.pool.reload(manifest_file)
 
     def run(self):
         self.running = True
-        self.server = SimpleXMLRPCServer(
+        self.server = PooledXMLRPCServer(
             self.address, allow_none=True, logRequests=False)
         logger.info(f'XMLRPC Server listening on {self.address}')
-        self.server.register_function(self.change_state, "change_state")
-        self.server.register_function(self.get_status, "get_status")
+        self.server.register_function(self._limit(self.batch), "batch")
+        self.server.register_function(
+            self._limit(self.change_state), "change_state")
+        self.server.register_function(
+            self._limit(self.get_status), "get_status")
         self.server.register_function(self.shutdown, "shutdown")
-        self.server.register_function(self.reload, "reload")
+        self.server.register_function(self._limit(self.reload), "reload")
+        self.server.register_introspection_functions()
         self.server.serve_forever()
 
     def start(self, interval: int = 60):
@@ -117,6 +215,7 @@ class GrueDaemon(threading.Thread):
 
     def stop(self):
         self.cycle.stop()
+        self.pool.shutdown()
         logger.info('Shutting down XMLRPC Server')
         self.server.shutdown()
         self.join()
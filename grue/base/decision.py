@@ -1,27 +1,66 @@
 from abc import ABC, abstractmethod
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
 
 from grue import base
 
 
+_engines: Dict[str, type] = None
+
+
+def engines() -> Dict[str, type]:
+    """Map DecisionEngine subclasses by name once on first use.
+
+    Engines are registered when the grue.decision subpackage is imported,
+    which happens before any Pool can select one, so the mapping does not
+    have to be rebuilt per call."""
+    global _engines
+    if _engines is None:
+        _engines = {
+            cls.__name__: cls for cls in DecisionEngine.__subclasses__()}
+    return _engines
+
+
 class DecisionEngine(ABC):
     _pool: base.Pool = None
 
     def __init__(self, pool: base.Pool):
         self.pool = pool
 
-    def _decide(self):
-        for machine in self.eval_turn_on():
-            self.pool.machine[machine].turn_on()
+    def _decide(self) -> int:
+        """Execute the evaluated power actions and return how many were
+        taken, so callers can tell whether the pool is changing."""
+        turn_on = self.eval_turn_on()
+        self._dispatch(turn_on, 'turn_on')
+
+        turn_off = self.eval_turn_off()
+        self._dispatch(turn_off, 'turn_off')
+
+        return len(turn_on) + len(turn_off)
+
+    def _dispatch(self, machines: List[str], action: str) -> None:
+        """Issue a power action to many machines in parallel.
+
+        Each power command is a blocking BMC round-trip; dialing the BMCs
+        one after another makes large turn-on/turn-off waves scale with
+        the number of targeted machines. Every interface is independent,
+        so the commands fan out over a thread pool. InterfaceErrors are
+        handled per machine by the State methods themselves."""
+        if not machines:
+            return
 
-        for machine in self.eval_turn_off():
-            self.pool.machine[machine].turn_off()
+        machine = self.pool.machine
+        workers = min(32, len(machines))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(
+                lambda name: getattr(machine[name], action)(), machines))
 
-    def decide(self):
+    def decide(self) -> int:
         self.pool.update()
-        self._decide()
+        actions = self._decide()
         self.pool.save()
         self.pool.cleanup()
+        return actions
 
     @abstractmethod
     def eval_turn_on(self) -> List[str]:
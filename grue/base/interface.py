@@ -7,11 +7,15 @@ logger = logging.getLogger(__name__)
 
 
 class ManagementInterface(ABC):
-    _bmc: str = None
-    _interface = None
-    _power_on: bool = None
+    __slots__ = ('_bmc', '_interface', '_power_on')
+
+    _bmc: str
+    _interface: object
+    _power_on: bool
 
     def __init__(self, auth: Tuple[str, str], hostname: str):
+        self._interface = None
+        self._power_on = None
         self.bmc = hostname
         self.connect_interface(auth)
 
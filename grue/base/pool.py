@@ -1,11 +1,19 @@
 from __future__ import annotations
 from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Union, Tuple
 import json
 import logging
 import datetime
+import os
 import time
 
+try:
+    # C-implemented encoder/decoder, several times faster than stdlib json
+    import orjson
+except ImportError:
+    orjson = None
+
 from grue import base
 
 
@@ -16,10 +24,14 @@ class Pool(ABC):
     _default_interface: base.ManagementInterface = None
     _engine: base.DecisionEngine = None
     _machines: List[Machine]
+    _machine_by_name: Dict[str, Machine] = None
     _jobs: List
     _interface_session_auth: Tuple[str, str] = None
     _interfaces: dict = None
     _state_file: str = None
+    _last_saved_snapshot: Dict[str, Tuple] = None
+    _last_save_time: float = 0
+    _session_ttl: int = 600
 
     def __init__(
             self, manifest_file: str = None, state_file: str = None,
@@ -94,18 +106,22 @@ class Pool(ABC):
         interface = self._interfaces[interface](auth=auth, hostname=name)
         self._add_machine(name=name, interface=interface)
 
+        # keep the name index in step so populating M machines does not
+        # trigger M full rebuilds of the mapping
+        if self._machine_by_name is not None:
+            self._machine_by_name[name] = self._machines[-1]
+
     def cleanup(self):
         """Mandatory cleanup procedures"""
-        self.close_interface_sessions()
         self.jobs = []
         self._cleanup()
 
-    def decide(self):
+    def decide(self) -> int:
         """Shortcut to the selected engine's decision-making process"""
         if not self.engine:
             raise ValueError('No engine selected')
 
-        self.engine.decide()
+        return self.engine.decide()
 
     @property
     def default_interface(self) -> base.ManagementInterface:
@@ -127,9 +143,7 @@ class Pool(ABC):
 
     @engine.setter
     def engine(self, engine: str):
-        engines = {
-            cls.__name__: cls
-            for cls in base.DecisionEngine.__subclasses__()}
+        engines = base.decision.engines()
 
         if engine not in engines.keys():
             raise ValueError(f'Unknown engine: {engine}')
@@ -165,8 +179,24 @@ class Pool(ABC):
     @property
     def machine(self) -> Dict[str, Machine]:
         """Transform List[Machine] to Dict[str, Machine] so that machines can
-        be called by name, e.g. `machine['cpu1.htc.inm7.de']`."""
-        return {machine.name: machine for machine in self.machines}
+        be called by name, e.g. `machine['cpu1.htc.inm7.de']`.
+
+        The mapping is cached and only rebuilt when the machine list
+        changes, so repeated lookups in loops stay O(1)."""
+        if self._machine_by_name is None or \
+                len(self._machine_by_name) != len(self._machines):
+            self._machine_by_name = {
+                machine.name: machine for machine in self._machines}
+
+        return self._machine_by_name
+
+    @property
+    def active_machines(self) -> List[Machine]:
+        """Machines whose state grue can still act on.
+
+        Maintenance and Stuck machines are excluded so they do not cost a
+        BMC session and power query every cycle."""
+        return [machine for machine in self._machines if machine.pollable]
 
     @property
     def machines(self) -> List[Machine]:
@@ -175,6 +205,7 @@ class Pool(ABC):
     @machines.setter
     def machines(self, value: List[Machine]) -> None:
         self._machines = value
+        self._machine_by_name = None
 
     @property
     def state_file(self) -> str:
@@ -190,20 +221,74 @@ class Pool(ABC):
         self._populate(manifest_file)
 
     def open_interface_sessions(self):
-        """Reset and start a new IPMI session using stored credentials"""
-        for machine in self.machines:
-            machine.interface.open_session()
+        """Open interface sessions for machines whose session is stale.
+
+        Session establishment is a multi-packet handshake per BMC, so
+        sessions persist across cycles and are only reestablished after
+        _session_ttl seconds instead of once per cycle. Each session is
+        independent, so the handshakes run in parallel rather than
+        blocking the cycle one round-trip at a time."""
+        machines = self.active_machines
+        if not machines:
+            return
+
+        def open_session(machine: Machine) -> None:
+            if machine.session_opened_at and \
+                    time.time() - machine.session_opened_at < \
+                    self._session_ttl:
+                return
+
+            if machine.session_opened_at:
+                try:
+                    machine.interface.close_session()
+                except Exception as e:
+                    logger.debug(
+                        f'Ignore close of stale session to '
+                        f'{machine.interface.bmc}: {e}')
+
+            try:
+                machine.interface.open_session()
+                machine.session_opened_at = time.time()
+            except Exception as e:
+                logger.error(
+                    f'Communication to {machine.interface.bmc} failed: {e}')
+                machine.transition_to(base.state.Unavailable())
+
+        workers = min(32, len(machines))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(open_session, machines))
 
     def close_interface_sessions(self):
-        for machine in self.machines:
-            machine.interface.close_session()
+        if not self.machines:
+            return
+
+        def close_session(machine: Machine) -> None:
+            try:
+                machine.interface.close_session()
+            except Exception as e:
+                logger.debug(
+                    f'Ignore close of session to '
+                    f'{machine.interface.bmc}: {e}')
+
+            machine.session_opened_at = None
+
+        workers = min(32, len(self.machines))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(close_session, self.machines))
+
+    def shutdown(self):
+        """Release pool resources; called when the daemon stops"""
+        self.close_interface_sessions()
 
     def load(self, state_file: str) -> None:
         """Load the machine states from a state file if one is given"""
         try:
-            with open(self.state_file, 'r') as file:
-                data = json.load(file)
-        except json.decoder.JSONDecodeError:
+            with open(self.state_file, 'rb') as file:
+                if orjson is not None:
+                    data = orjson.loads(file.read())
+                else:
+                    data = json.loads(file.read())
+        except ValueError:
             logger.warning(f'State file could not be opened')
             return
         except FileNotFoundError:
@@ -220,62 +305,169 @@ class Pool(ABC):
             return
         else:
             logger.info(f'Load machine states from {self.state_file}')
-            states = {s.__name__: s for s in base.State.__subclasses__()}
+            states = base.state.STATES
+            machine_by_name = self.machine
 
             for name, info in data.get('machines', {}).items():
-                if name in self.machine.keys():
-                    self.machine[name].transition_to(
+                if name in machine_by_name.keys():
+                    machine_by_name[name].transition_to(
                         states[info.get('state', 'Off')]())
-                    self.machine[name].timer = info.get('timer', None)
+                    machine_by_name[name].timer = info.get('timer', None)
 
     def reload(self, manifest_file: str):
-        """Reestablish the pool from a new manifest file"""
+        """Reestablish the pool from a new manifest file.
+
+        Rebuilding from scratch would drop every machine state and live
+        interface session even when the manifest barely changed. Machines
+        that are still present after the reload therefore inherit the
+        state, timers and open session of their previous incarnation, and
+        only machines removed from the manifest get their session
+        closed."""
         logger.info('Reload grue data')
-        self.machines = []
+        previous = self.machine
         self.populate(manifest_file)
+
+        for machine in self.machines:
+            old = previous.get(machine.name, None)
+            if old is None:
+                continue
+
+            if type(machine.interface) is type(old.interface):
+                machine.interface = old.interface
+                machine.session_opened_at = old.session_opened_at
+
+            machine.transition_to(old.state)
+            machine.timer = old.timer
+            machine.last_active = old.last_active
+
+        for name, machine in previous.items():
+            if name not in self.machine.keys() and machine.session_opened_at:
+                try:
+                    machine.interface.close_session()
+                except Exception as e:
+                    logger.debug(
+                        f'Ignore close of session to '
+                        f'{machine.interface.bmc}: {e}')
+
         self.load(self.state_file)
 
     def save(self) -> None:
         """Store state information of each machine in the pool as a json
-        file"""
+        file.
+
+        The file is only rewritten when a machine state or timer changed
+        since the last save (with a periodic refresh so the last_save
+        expiry used by load() stays current), and the write goes through a
+        temporary file with os.replace so a crash cannot leave behind a
+        half-written state file."""
         if not self.state_file:
             return
 
+        snapshot = {
+            machine.name: (machine.state.STATE_NAME, machine.timer)
+            for machine in self.machines}
+
+        if snapshot == self._last_saved_snapshot and \
+                time.time() - self._last_save_time < 300:
+            return
+
         data = {
-            'machines': {}, 'last_save': datetime.datetime.now().timestamp()}
+            'machines': {
+                name: {'state': state, 'timer': timer}
+                for name, (state, timer) in snapshot.items()},
+            'last_save': datetime.datetime.now().timestamp()}
 
-        for machine in self.machines:
-            data['machines'][machine.name] = {
-                'state': machine.state.__name__(),
-                'timer': machine.state.timer}
+        if orjson is not None:
+            encoded = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        else:
+            encoded = json.dumps(data, sort_keys=True).encode()
+
+        tmp_file = f'{self.state_file}.tmp'
+        with open(tmp_file, 'wb') as file:
+            file.write(encoded)
 
-        with open(self.state_file, 'w') as file:
-            json.dump(data, file, indent=4, sort_keys=True)
+        os.replace(tmp_file, self.state_file)
+        self._last_saved_snapshot = snapshot
+        self._last_save_time = time.time()
+
+    def update_power_cache(self) -> None:
+        """Read the power state of every machine in parallel and cache it.
+
+        Each BMC read blocks on network round-trip time, so reading them one
+        by one makes a cycle scale with the pool size. Fanning the reads out
+        over a thread pool once per cycle and caching the result on each
+        Machine means State.verify does not have to query the BMC again."""
+        machines = self.active_machines
+        if not machines:
+            return
+
+        def read_power(machine: Machine) -> None:
+            machine.cached_power = None
+            try:
+                machine.cached_power = machine.interface.power
+            except base.InterfaceError as e:
+                logger.error(
+                    f'Communication to {machine.interface.bmc} failed: {e}')
+                machine.transition_to(base.state.Unavailable())
+
+        workers = min(32, len(machines))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(read_power, machines))
 
     def update(self) -> None:
         """Update machines with HTCondor Collector data"""
+        if not self.active_machines:
+            logger.debug('Skip update; no machines can be acted on')
+            self._update()
+            return
+
         self.open_interface_sessions()
-        self.get_machine_power_state()
+        self.update_power_cache()
 
-        if all([
+        if all(
                 isinstance(m.state, (base.state.On, base.state.Booting))
-                for m in self.machines]):
-            logger.debug('Skip update; all machines are On')
+                for m in self.machines):
+            logger.debug('Skip job query; all machines are On')
+            self.get_machine_power_state()
         else:
-            self.get_jobs()
+            # get_machine_power_state (collector) and get_jobs (schedd)
+            # talk to different HTCondor daemons, so the two blocking
+            # round-trips overlap instead of adding up
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                power_state = executor.submit(self.get_machine_power_state)
+                jobs = executor.submit(self.get_jobs)
+                power_state.result()
+                jobs.result()
 
         self._update()
 
 
 class Machine(ABC):
-    """Client interface base class for holding and changing states."""
-    _state: base.State = None
-    _timer: Union[int, None] = None
-    _last_active: Union[int, None] = None
-    _name: str = None
-    _interface: base.ManagementInterface = None
+    """Client interface base class for holding and changing states.
+
+    __slots__ keeps per-instance memory small for large pools; the
+    __weakref__ slot is required because each State holds a weak
+    back-reference to its Machine."""
+    __slots__ = (
+        '_state', '_timer', '_last_active', '_name', '_interface', '_slots',
+        '_cached_power', '_pollable', '_session_opened_at', '__weakref__')
+
+    _state: base.State
+    _timer: Union[int, None]
+    _last_active: Union[int, None]
+    _name: str
+    _interface: base.ManagementInterface
+    _cached_power: Union[bool, None]
+    _pollable: bool
+    _session_opened_at: Union[float, None]
 
     def __init__(self, name: str, state: base.State) -> None:
+        self._state = None
+        self._timer = None
+        self._interface = None
+        self._cached_power = None
+        self._pollable = True
+        self._session_opened_at = None
         self.name = name
         self._slots = []
         self._last_active = int(time.time())
@@ -285,6 +477,20 @@ class Machine(ABC):
         """The length of a pool is its number of machines"""
         return len(self._slots)
 
+    @property
+    def cached_power(self) -> Union[bool, None]:
+        """Power state cached by Pool.update_power_cache.
+
+        Falls back to a direct BMC read when no cached value is available,
+        e.g. when verify is triggered outside a regular cycle."""
+        if self._cached_power is None:
+            self._cached_power = self.interface.power
+        return self._cached_power
+
+    @cached_power.setter
+    def cached_power(self, value: Union[bool, None]) -> None:
+        self._cached_power = value
+
     @property
     def interface(self) -> base.ManagementInterface:
         return self._interface
@@ -329,11 +535,29 @@ class Machine(ABC):
         logger.debug(f'Set {self.name} last-active timer to {value}')
         self._last_active = value
 
+    @property
+    def session_opened_at(self) -> Union[float, None]:
+        return self._session_opened_at
+
+    @session_opened_at.setter
+    def session_opened_at(self, value: Union[float, None]) -> None:
+        self._session_opened_at = value
+
+    @property
+    def pollable(self) -> bool:
+        """Whether grue should still poll this machine.
+
+        Cached on transition so Pool.update does not repeat the state
+        isinstance checks for every machine every cycle."""
+        return self._pollable
+
     def transition_to(self, state: base.State):
         """Change Context State at runtime"""
         logger.debug(f'Transition {self.name} to {repr(state)}')
         self._state = state
         self._state.context = self
+        self._pollable = not isinstance(
+            state, (base.state.Maintenance, base.state.Stuck))
 
     """Delegate behavior to the current State object where necessary"""
     def turn_on(self):
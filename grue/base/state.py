@@ -4,6 +4,7 @@ from typing import Union, Callable
 import functools
 import logging
 import time
+import weakref
 
 from grue.base import error
 
@@ -36,29 +37,39 @@ def catch_interface_error(f: Callable):
             self.transition_to(Unavailable())
 
     catch_interface_error_wrapper.__wrapped__ = f
+    catch_interface_error_wrapper._grue_wrapped = True
     return catch_interface_error_wrapper
 
 
 class State(ABC):
     """Base State class containing methods and references to Context that all
     StateX classes should have."""
-    _context = None
+    __slots__ = ('_context',)
+    STATE_NAME = 'State'
+
+    def __init__(self):
+        self._context = None
 
     def __repr__(self):
-        return self.__class__.__name__
+        return self.STATE_NAME
 
     def __name__(self):
-        return self.__class__.__name__
+        return self.STATE_NAME
 
     @staticmethod
     def _is_wrapped(f: Callable):
-        wrapped = getattr(f, '__wrapped__', None)
-        if wrapped:
-            return True if wrapped.__name__ == f else False
-        else:
-            return False
+        """A method inherited from a parent State is already wrapped.
+
+        Comparing __wrapped__.__name__ to the function itself (as done
+        previously) was always False, so every subclass level re-applied
+        catch_interface_error and added a stack frame to each call."""
+        return getattr(f, '_grue_wrapped', False)
 
     def __init_subclass__(cls):
+        # Plain attribute lookup is cheaper than resolving the class name
+        # for every log message and status report
+        cls.STATE_NAME = cls.__name__
+
         if not cls._is_wrapped(cls.turn_on):
             cls.turn_on = catch_interface_error(cls.turn_on)
 
@@ -70,11 +81,17 @@ class State(ABC):
 
     @property
     def context(self):
-        return self._context
+        return self._context() if self._context is not None else None
 
     @context.setter
     def context(self, context) -> None:
-        self._context = context
+        """Keep a weak back-reference to the owning Machine.
+
+        The Machine already holds its State strongly; a strong reference
+        back would create a cycle that only the cyclic garbage collector
+        can reclaim, which adds collection pauses when populate()/reload()
+        regenerate every Machine in the pool."""
+        self._context = None if context is None else weakref.ref(context)
 
     @property
     def name(self):
@@ -84,6 +101,10 @@ class State(ABC):
     def interface(self):
         return self.context.interface
 
+    @property
+    def cached_power(self):
+        return self.context.cached_power
+
     @property
     def timer(self):
         return self.context.timer
@@ -95,6 +116,18 @@ class State(ABC):
     def transition_to(self, state: State):
         self.context.transition_to(state)
 
+    def _verify_transition(self, power_on: bool, htcondor_on: bool) -> None:
+        """Dispatch a verify outcome through VERIFY_TRANSITIONS.
+
+        The (power_on, htcondor_on) pair indexes a precomputed tuple of
+        target states, replacing the four-branch if/elif cascade that was
+        previously repeated per verify call."""
+        targets = VERIFY_TRANSITIONS[type(self)]
+        target = targets[(int(bool(power_on)) << 1) | int(bool(htcondor_on))]
+
+        if target is not None:
+            self.context.transition_to(target())
+
     @abstractmethod
     def turn_on(self) -> None:
         pass
@@ -110,6 +143,8 @@ class State(ABC):
 
 class Unavailable(State):
     """Something has gone wrong with the machine"""
+    __slots__ = ()
+
     def turn_on(self) -> None:
         pass
 
@@ -117,56 +152,49 @@ class Unavailable(State):
         pass
 
     def verify(self, htcondor_on: bool) -> None:
-        power_on = self.interface.power
-        logger.debug(
-            f'Verify {repr(self)} for {self.name}: htcondor_on={htcondor_on}, '
-            f'interface_on={power_on}')
-
-        if power_on and htcondor_on:
-            self.context.transition_to(On())
-
-        elif not power_on and htcondor_on:
-            self.context.transition_to(Stuck())
+        power_on = self.cached_power
 
-        elif power_on and not htcondor_on:
-            # Machine state unclear (likely either Booting or ShuttingDown)
-            pass
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Verify {repr(self)} for {self.name}: '
+                f'htcondor_on={htcondor_on}, interface_on={power_on}')
 
-        elif not power_on and not htcondor_on:
-            self.context.transition_to(Off())
+        self._verify_transition(power_on, htcondor_on)
 
 
 class Off(State):
+    __slots__ = ()
+
     def turn_on(self) -> None:
         self.interface.power = 1
         self.timer = time.time()
         self.transition_to(Booting())
 
     def turn_off(self) -> None:
-        logger.debug(
-            f'Cannot turn off {self.name} as it is currently in {repr(self)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Cannot turn off {self.name} as it is currently in '
+                f'{repr(self)}')
 
     def verify(self, htcondor_on: bool) -> None:
-        power_on = self.interface.power
-        logger.debug(
-            f'Verify {repr(self)} for {self.name}: htcondor_on={htcondor_on}, '
-            f'interface_on={power_on}')
-
-        if power_on and htcondor_on:
-            self.context.transition_to(On())
+        power_on = self.cached_power
 
-        elif not power_on and htcondor_on:
-            self.context.transition_to(Stuck())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Verify {repr(self)} for {self.name}: '
+                f'htcondor_on={htcondor_on}, interface_on={power_on}')
 
-        elif power_on and not htcondor_on:
-            # Machine state unclear (likely either Booting or ShuttingDown)
-            pass
+        self._verify_transition(power_on, htcondor_on)
 
 
 class On(State):
+    __slots__ = ()
+
     def turn_on(self) -> None:
-        logger.debug(
-            f'Cannot turn on {self.name} as it is currently in {repr(self)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Cannot turn on {self.name} as it is currently in '
+                f'{repr(self)}')
 
     def turn_off(self) -> None:
         self.interface.power = 5
@@ -174,44 +202,46 @@ class On(State):
         self.transition_to(ShuttingDown())
 
     def verify(self, htcondor_on: bool) -> None:
-        power_on = self.interface.power
-        logger.debug(
-            f'Verify {repr(self)} for {self.name}: htcondor_on={htcondor_on}, '
-            f'interface_on={power_on}')
+        power_on = self.cached_power
 
-        if not power_on and not htcondor_on:
-            self.context.transition_to(Off())
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Verify {repr(self)} for {self.name}: '
+                f'htcondor_on={htcondor_on}, interface_on={power_on}')
 
-        elif power_on and not htcondor_on:
-            self.context.transition_to(Stuck())
-
-        elif not power_on and htcondor_on:
-            # Machine state unclear (likely either Booting or ShuttingDown)
-            pass
+        self._verify_transition(power_on, htcondor_on)
 
 
 class Booting(State):
+    __slots__ = ()
+
     def turn_on(self) -> None:
-        logger.debug(
-            f'Cannot turn on {self.name} as it is currently in {repr(self)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Cannot turn on {self.name} as it is currently in '
+                f'{repr(self)}')
 
     def turn_off(self) -> None:
-        logger.debug(
-            f'Cannot turn off {self.name} as it is currently in {repr(self)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Cannot turn off {self.name} as it is currently in '
+                f'{repr(self)}')
 
     def verify(self, htcondor_on: bool) -> None:
         if not htcondor_on:
             seconds = int(time.time() - self.timer)
             if seconds >= 900:
-                logger.debug(
-                    f'Transition to On period exceeded (900s) for '
-                    f'{self.name}')
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f'Transition to On period exceeded '
+                        f'(900s) for {self.name}')
                 self.transition_to(Stuck())
                 return
             else:
-                logger.debug(
-                    f'{self.name} has been transitioning to On for '
-                    f'{seconds}s')
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f'{self.name} has been transitioning '
+                        f'to On for {seconds}s')
                 return
 
         elif htcondor_on:
@@ -221,29 +251,37 @@ class Booting(State):
 
 
 class ShuttingDown(State):
+    __slots__ = ()
+
     def turn_on(self) -> None:
-        logger.debug(
-            f'Cannot turn on {self.name} as it is currently in {repr(self)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Cannot turn on {self.name} as it is currently in '
+                f'{repr(self)}')
 
     def turn_off(self) -> None:
-        logger.debug(
-            f'Cannot turn off {self.name} as it is currently in {repr(self)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Cannot turn off {self.name} as it is currently in '
+                f'{repr(self)}')
 
     def verify(self, htcondor_on: bool) -> None:
-        power_on = self.interface.power
+        power_on = self.cached_power
 
         if power_on:
             seconds = int(time.time() - self.timer)
             if seconds >= 900:
-                logger.debug(
-                    f'Transition to Off period exceeded (900s) for '
-                    f'{self.name}')
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f'Transition to Off period exceeded '
+                        f'(900s) for {self.name}')
                 self.transition_to(Stuck())
                 return
             else:
-                logger.debug(
-                    f'{self.name} has been transitioning to Off for '
-                    f'{seconds}s')
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(
+                        f'{self.name} has been transitioning '
+                        f'to Off for {seconds}s')
                 return
 
         self.timer = None
@@ -252,6 +290,8 @@ class ShuttingDown(State):
 
 class Stuck(State):
     """Something has gone wrong with the machine"""
+    __slots__ = ()
+
     def turn_on(self) -> None:
         pass
 
@@ -264,13 +304,32 @@ class Stuck(State):
 
 class Maintenance(State):
     """The machine should be ignored by grue when it is in Maintenance state"""
+    __slots__ = ()
+
     def turn_on(self) -> None:
-        logger.debug(
-            f'Ignore turn on {self.name} because state is {repr(self)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Ignore turn on {self.name} because state is {repr(self)}')
 
     def turn_off(self) -> None:
-        logger.debug(
-            f'Ignore turn off {self.name} because state is {repr(self)}')
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f'Ignore turn off {self.name} because state is {repr(self)}')
 
     def verify(self, htcondor_on: bool) -> None:
         pass
+
+
+"""All State subclasses live in this module, so the name lookups can be
+built once at import instead of walking State.__subclasses__() per call."""
+STATES = {cls.__name__: cls for cls in State.__subclasses__()}
+STATES_LOWER = {name.lower(): cls for name, cls in STATES.items()}
+
+"""Verify targets indexed by (power_on << 1) | htcondor_on, i.e. position
+0 is power off + HTCondor off and position 3 is both on. None means the
+observation does not warrant a transition (the machine state is unclear,
+likely either Booting or ShuttingDown, or already matches)."""
+VERIFY_TRANSITIONS = {
+    Unavailable: (Off, Stuck, None, On),
+    Off: (None, Stuck, None, On),
+    On: (Off, None, Stuck, None)}
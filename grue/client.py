@@ -2,13 +2,14 @@ from __future__ import annotations
 from argparse import ArgumentParser
 from typing import List
 from xmlrpc import client
-import datetime
+import time
 
 import htcondor
 
 from grue import __version__, XMLRPC_HOST, XMLRPC_PORT
-from grue.utils import argument, subcommand, ClassAdCollector
-from grue.base import State
+from grue.utils import (
+    argument, subcommand, collector, machine_constraint, ClassAdCollector)
+from grue.base.state import STATES
 
 
 cli = ArgumentParser(
@@ -39,13 +40,7 @@ def create_manifest(args):
     machines.remove('gpu2.htc.inm7.de')
 
     collector.constraint = 'SlotType != "Dynamic"'
-    for i, machine in enumerate(machines):
-        if i == 0:
-            collector.constraint_and(f'(Machine == "{machine}"')
-        elif i == len(machines)-1:
-            collector.constraint_or(f'Machine == "{machine}")')
-        else:
-            collector.constraint_or(f'Machine == "{machine}"')
+    collector.constraint_and(machine_constraint(machines))
 
     collector.projection = [
         'SlotID', 'Name', 'Arch', 'OpSys', 'SlotType', 'Machine',
@@ -61,7 +56,7 @@ def create_manifest(args):
             type=str, dest='state',
             help=(
                 f'Name of the state to change machines to. Possible states: '
-                f'{[s.__name__ for s in State.__subclasses__()]}')),
+                f'{list(STATES)}')),
         argument(
             type=str, dest='machines', nargs="+",
             help='List of machines to change the state of')])
@@ -119,28 +114,27 @@ def status(args):
             print(row_format.format(*row))
 
     def add_idle_time(machines: list):
-        constraint = [f'Machine == "{m[0]}"' for m in machines]
-        constraint = f'{" || ".join(constraint)}'
-        result = htcondor.Collector().query(
+        constraint = machine_constraint([m[0] for m in machines])
+        result = collector().query(
             htcondor.AdTypes.Startd,
             projection=[
                 'Machine', 'EnteredCurrentActivity', 'State', 'Activity'],
             constraint=constraint)
 
-        # Remove machines for which at least 1 slot is active
-        not_idle = list(set([
-            slot['Machine'] for slot in result
-            if slot['Activity'] != "Idle" or slot['State'] != "Unclaimed"]))
-        result = [slot for slot in result if slot['Machine'] not in not_idle]
-
-        # Filter to lowest idle time
-        idle_time = {slot['Machine']: [] for slot in result}
+        # Single pass over the slot ads: track the lowest idle time per
+        # machine and drop machines for which at least 1 slot is active
+        now = int(time.time())
+        idle_time = {}
+        not_idle = set()
         for slot in result:
-            idle_time[slot['Machine']].append(int(
-                datetime.datetime.now().timestamp() -
-                slot['EnteredCurrentActivity']))
-
-        idle_time = {k: min(v) for k, v in idle_time.items()}
+            name = slot['Machine']
+            if slot['Activity'] != "Idle" or slot['State'] != "Unclaimed":
+                not_idle.add(name)
+                idle_time.pop(name, None)
+            elif name not in not_idle:
+                seconds = now - int(slot['EnteredCurrentActivity'])
+                if seconds < idle_time.get(name, seconds + 1):
+                    idle_time[name] = seconds
 
         # Add the new data to machines
         for machine in machines:
@@ -174,7 +168,7 @@ def status(args):
     machines = add_idle_time(machines)
 
     # Format TransitionTimer
-    now = datetime.datetime.now().timestamp()
+    now = time.time()
     for m in machines:
         m[3] = f'{int(now-m[3])}s' if m[3] else '-'
 
@@ -1,4 +1,5 @@
 from typing import List
+import functools
 import logging
 import time
 
@@ -7,55 +8,100 @@ from classad.classad import ExprTree
 
 from grue import base
 from grue.base.pool import Machine
+from grue.utils import collector, machine_constraint
 
 
 logger = logging.getLogger(__name__)
 
+# Sort precedence used by sort_machines: Booting first, Off second, the
+# rest last; computed once instead of instantiating states per call
+_SORT_ORDER = {base.state.Booting.STATE_NAME: 0, base.state.Off.STATE_NAME: 1}
+
+# The CPU requirement clause is a constant, so it is parsed once at
+# module load instead of once per evaluated job
+_CPU_REQ = ExprTree('(TARGET.Cpus >= RequestCpus)')
+
+
+@functools.lru_cache(maxsize=256)
+def _requirements_with_cpus(req: str) -> ExprTree:
+    """Parse a job Requirements expression and append the CPU clause.
+
+    Jobs submitted from the same cluster share identical Requirements
+    text, so the parsed result is memoized by string."""
+    return ExprTree(req).and_(_CPU_REQ)
+
 
 class SequentialDecisionEngine(base.DecisionEngine):
     """This decision engine allocates jobs to machines in sequential order
     until the machine is at full capacity and then determines which machines
     to turn on."""
     def eval_turn_off(self) -> List[str]:
+        """Evaluate which machines are idle enough to be turned off.
+
+        A single collector query fetches state and activity for every
+        candidate machine; the claimed/idle partitioning happens in
+        Python. Querying per predicate (claimed, then activity) costs one
+        collector round-trip each for the same set of slot ClassAds."""
         machines = [
             m for m in self.pool.machines
             if isinstance(m.state, base.state.On)]
 
-        if machines:
-            # update machines that are currently claimed
-            claimed_machines = self.get_claimed(machines)
-            for m in claimed_machines:
-                m.last_active = time.time()
+        if not machines:
+            logger.info(
+                'No machines have to be turned off (no machines with '
+                'state=On())')
+            return []
 
-            machines = [m for m in machines if m not in claimed_machines]
+        idle_seconds = 3600
+        now = time.time()
 
-            if not machines:
-                logger.info(
-                    'No machines have to be turned off (no idle machines)')
-                return []
+        logger.debug(
+            'Query HTCondor for the state and activity of pool machines')
+        result = collector().query(
+            htcondor.AdTypes.Startd,
+            projection=[
+                'Machine', 'State', 'Activity', 'EnteredCurrentActivity'],
+            constraint=machine_constraint([m.name for m in machines]))
+
+        # a machine is claimed if any of its slots is in use
+        claimed = {
+            ad['Machine'] for ad in result
+            if ad['State'] not in ('Unclaimed', 'Drained')}
+
+        # a machine is idle if a slot has been unclaimed for idle_seconds
+        idle = {
+            ad['Machine'] for ad in result
+            if ad['State'] == 'Unclaimed' and ad['Activity'] == 'Idle' and
+            ad['EnteredCurrentActivity'] <= now - idle_seconds}
+
+        # update machines that are currently claimed
+        for m in machines:
+            if m.name in claimed:
+                m.last_active = now
+
+        machines = [m for m in machines if m.name not in claimed]
 
-            # determine inactivity by classad property
-            idle_seconds = 3600
-            machines = self.filter_by_activity(machines, idle_seconds)
+        if not machines:
+            logger.info(
+                'No machines have to be turned off (no idle machines)')
+            return []
 
-            # fallback determination of inactivity by Machine.state.timer
-            machines = [
-                m for m in machines
-                if m.last_active and m.last_active+idle_seconds < time.time()]
+        # determine inactivity by classad property
+        machines = [m for m in machines if m.name in idle]
 
-            if not machines:
-                logger.info(
-                    f'No machines have to be turned off (idle machines have '
-                    f'been idle less than {idle_seconds}s)')
-                return []
+        # fallback determination of inactivity by Machine.state.timer
+        machines = [
+            m for m in machines
+            if m.last_active and m.last_active+idle_seconds < now]
 
-            return [m.name for m in machines]
-        else:
+        if not machines:
             logger.info(
-                'No machines have to be turned off (no machines with '
-                'state=On())')
+                f'No machines have to be turned off (idle machines have '
+                f'been idle less than {idle_seconds}s)')
             return []
 
+        return [m.name for m in machines]
+
     def eval_turn_on(self) -> List[str]:
         if not self.pool.jobs:
             logger.info('No machines have to be turned on (no idle jobs)')
@@ -68,28 +114,36 @@ class SequentialDecisionEngine(base.DecisionEngine):
             return []
 
         machines = self.sort_machines(machines)
-        used_machines = []
+        # Minimum requirement is 1 CPU; slots without one can never match
+        slots = [
+            s for m in machines for s in m.slots
+            if s.classad.get('Cpus', 0) > 0]
+        # dict keys give O(1) deduplicating adds while keeping
+        # assignment order, so no collapse pass is needed at the end
+        used_machines = {}
+        jobs = self.pool.jobs
+        jobs_total = len(jobs)
         jobs_failed = 0
-        jobs_total = 0
         jobs_assigned = 0
-        for job in self.pool.jobs:
-            jobs_total += 1
+        for i, job in enumerate(jobs):
+            if not slots:
+                # every remaining job would be matched against zero live
+                # slots, so fail them in one go instead of evaluating
+                # their requirements
+                jobs_failed += jobs_total - i
+                break
 
             # Add CPU requirement to job if not present
             req = str(job.get('Requirements', None))
             if job.get('RequestCpus', 1) == 1 and 'RequestCpus' not in req:
-                expr = ExprTree(req)
-                expr = expr.and_(ExprTree('(TARGET.Cpus >= RequestCpus)'))
-                job['Requirements'] = expr
-
-            for slot in [s for m in machines for s in m.slots]:
-                # Minimum requirement is 1 CPU
-                if slot.classad.get('Cpus', 0) <= 0:
-                    continue
+                job['Requirements'] = _requirements_with_cpus(req)
 
+            for slot in slots:
                 if slot.assign_job(job):
                     jobs_assigned += 1
-                    used_machines.append(slot.parent.name)
+                    used_machines[slot.parent.name] = None
+                    if self.slot_exhausted(slot):
+                        slots.remove(slot)
                     break
             else:
                 jobs_failed += 1
@@ -99,44 +153,19 @@ class SequentialDecisionEngine(base.DecisionEngine):
             f'{jobs_failed} jobs out of {jobs_total} total evaluated '
             f'idle jobs')
 
-        return list(set(used_machines))
+        return list(used_machines)
 
     @staticmethod
-    def filter_by_activity(
-            machines: List[Machine],
-            idle_seconds: int = 3600) -> List[Machine]:
-        """Remove machines from a list if they have not been idle for at least
-        the given idle_seconds (default is 1 hour)."""
-        logger.debug(
-            f'Query for idle machines with Activity == "Idle" && '
-            f'EnteredCurrentActivity <= now() - {idle_seconds}s')
-        constraint = [f'Machine == "{m.name}"' for m in machines]
-        constraint = (
-            f'({" || ".join(constraint)}) && State == "Unclaimed" && '
-            f'Activity == "Idle" && '
-            f'EnteredCurrentActivity <= {time.time() - idle_seconds}')
-        result = htcondor.Collector().query(
-            htcondor.AdTypes.Startd, projection=['Machine'],
-            constraint=constraint)
-        inactive = list(set([slot['Machine'] for slot in result]))
-        return list(set([m for m in machines if m.name in inactive]))
+    def slot_exhausted(slot) -> bool:
+        """Whether a slot can no longer accept any job.
 
-    @staticmethod
-    def get_claimed(machines: List[Machine]) -> List[Machine]:
-        """Keep machines in a list if one of its slots appears to be in
-        use (i.e., it is not unclaimed or drained)"""
-        logger.debug(
-            'Query for active machines with State!="Unclaimed" '
-            '&& State!="Drained"')
-        constraint = ' || '.join([f'Machine == "{m.name}"' for m in machines])
-        constraint = (
-            f'({constraint}) && State != "Unclaimed" '
-            f'&& State != "Drained"')
-        result = htcondor.Collector().query(
-            htcondor.AdTypes.Startd, projection=['Machine'],
-            constraint=constraint)
-        claimed = list(set([slot['Machine'] for slot in result]))
-        return list(set([m for m in machines if m.name in claimed]))
+        A non-partitionable slot is spent once it holds a job; a
+        partitionable slot is spent once its CPUs are used up. Spent
+        slots are dropped from the candidate list so later jobs are not
+        matched against them."""
+        if not slot.partitionable:
+            return bool(slot.jobs)
+        return slot.classad.get('Cpus', 0) <= 0
 
     @staticmethod
     def reduce_machines(machines: List[base.Machine]) -> List[base.Machine]:
@@ -148,9 +177,8 @@ class SequentialDecisionEngine(base.DecisionEngine):
 
     @staticmethod
     def sort_machines(machines: List[base.Machine]) -> List[base.Machine]:
-        """Sort machines by name and then sort by state, listing
-        state Booting first, Off second, and the rest last"""
-        machines.sort(key=lambda x: x.name, reverse=False)
-        sort_order = {repr(base.state.Booting()): 0, repr(base.state.Off()): 1}
-        machines.sort(key=lambda x: sort_order.get(repr(x.state), 2))
+        """Sort machines by state, listing state Booting first, Off
+        second, and the rest last, with ties broken by name"""
+        machines.sort(
+            key=lambda x: (_SORT_ORDER.get(x.state.STATE_NAME, 2), x.name))
         return machines
@@ -11,7 +11,9 @@ logger = logging.getLogger(__name__)
 
 
 class IPMI(base.ManagementInterface):
-    _interface: Union[pyipmi.Ipmi, None] = None
+    __slots__ = ()
+
+    _interface: Union[pyipmi.Ipmi, None]
 
     def connect_interface(self, auth: Tuple[str, str]) -> None:
         interface = pyipmi.interfaces.create_interface(
@@ -97,7 +99,7 @@ class IPMI(base.ManagementInterface):
         except Exception as e:
             raise base.InterfaceError(e)
 
-        self.power_on = True if value == 1 else False
+        self.power_on = value == 1
 
     @property
     def power_on(self) -> bool:
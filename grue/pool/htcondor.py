@@ -1,17 +1,36 @@
 from __future__ import annotations
+import functools
 import json
 import logging
 from typing import Dict, List, Union
 
-from classad.classad import ClassAd
+from classad.classad import ClassAd, ExprTree
 import htcondor
 
+try:
+    # C-implemented encoder/decoder, several times faster than stdlib json
+    import orjson
+except ImportError:
+    orjson = None
+
 from grue import base
+from grue.utils import collector, machine_constraint, schedd
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=4096)
+def _parse_requirements(req: str) -> ExprTree:
+    """Parse a Requirements string into an ExprTree, memoized by text.
+
+    Jobs from the same cluster share identical Requirements, so the
+    classad parser only runs once per distinct expression."""
+    return ExprTree(req)
+
+
 class Machine(base.Machine):
+    __slots__ = ()
+
     _slots: List[Slot]
 
     def __len__(self) -> int:
@@ -41,19 +60,38 @@ class Machine(base.Machine):
 
 
 class Slot(object):
-    _classad: ClassAd = None
-    _jobs: List[ClassAd] = None
-    _parent: Machine = None
-    _tmp_resources: Dict = None
+    """Object for holding slot data.
+
+    __slots__ keeps per-instance memory small; pools carry an order of
+    magnitude more slots than machines."""
+    __slots__ = (
+        '_classad', '_jobs', '_parent', '_temp_resources', '_machine',
+        '_name', '_partitionable')
+
+    _classad: ClassAd
+    _jobs: List[ClassAd]
+    _parent: Machine
+    _temp_resources: Dict
+    _machine: str
+    _name: str
+    _partitionable: bool
 
     def __init__(self, ad: ClassAd) -> None:
-        """Object for holding slot data"""
         self._jobs = []
+        self._parent = None
         self._temp_resources = {}
         self.classad = ad
         self.reset_resources()
 
     def __repr__(self):
+        # keep repr O(1); walking the full ClassAd made every debug log
+        # of a Machine (and its slots) scale with the number of ad
+        # attributes
+        return (f'{self.__class__.__name__}'
+                f'(name={repr(self.name)}, machine={repr(self.machine)})')
+
+    def describe(self) -> str:
+        """Full dump of the slot ClassAd, for interactive inspection."""
         return '{0}({1})'.format(
             self.__class__.__name__,
             ', '.join([f'{k}={v}' for k, v in self.classad.items()]))
@@ -65,6 +103,11 @@ class Slot(object):
     @classad.setter
     def classad(self, value: ClassAd):
         self._classad = value
+        # These attributes never change for a given ClassAd, so they are
+        # read once here instead of on every property access
+        self._machine = value.get('Machine', None)
+        self._name = value.get('Name', 'unknown')
+        self._partitionable = value.get('SlotType', None) == 'Partitionable'
 
     @property
     def parent(self) -> Machine:
@@ -76,11 +119,11 @@ class Slot(object):
 
     @property
     def machine(self) -> str:
-        return self.classad.get('Machine', None)
+        return self._machine
 
     @property
     def name(self) -> str:
-        return self.classad.get('Name', 'unknown')
+        return self._name
 
     @property
     def jobs(self) -> List[ClassAd]:
@@ -92,8 +135,7 @@ class Slot(object):
 
     @property
     def partitionable(self) -> bool:
-        return True if self.classad.get('SlotType', None) == 'Partitionable' \
-            else False
+        return self._partitionable
 
     def reset_resources(self):
         """Reset job allocation and set dynamic resource values to their
@@ -118,6 +160,22 @@ class Slot(object):
         if self.classad.get(metric, None):
             self.classad[metric] -= x
 
+    def _satisfies_resources(self, job: ClassAd) -> bool:
+        """Cheap scalar pre-check of the job's resource requests.
+
+        Condor submit inserts the matching clauses (TARGET.Memory >=
+        RequestMemory etc.) into every job's Requirements, so a job
+        requesting more than the slot has left can be rejected on plain
+        integer comparisons without evaluating the ExprTree."""
+        for metric, request in (
+                ('Cpus', 'RequestCpus'), ('Memory', 'RequestMemory'),
+                ('Disk', 'RequestDisk'), ('GPUs', 'RequestGpus')):
+            available = self.classad.get(metric, None)
+            if available is not None and job.get(request, 0) > available:
+                return False
+
+        return True
+
     def assign_job(self, job: ClassAd) -> bool:
         """Assigns a job to this slot and returns True if it can do so, False
         if the slot has insufficient resources or the requirements expression
@@ -126,7 +184,16 @@ class Slot(object):
         if not self.partitionable and self.jobs:
             return False
 
-        elif not self.partitionable:
+        if not self._satisfies_resources(job):
+            return False
+
+        # jobs sourced from a manifest can carry Requirements as text;
+        # store the parsed tree back so every later slot reuses it
+        req = job.get('Requirements', None)
+        if isinstance(req, str):
+            job['Requirements'] = _parse_requirements(req)
+
+        if not self.partitionable:
             if self.classad.matches(job):
                 self.jobs.append(job)
                 return True
@@ -146,6 +213,12 @@ class Slot(object):
 
 
 class HTCondorPool(base.Pool):
+    # Only the attributes the decision engine reads; everything else
+    # stays on the schedd instead of being shipped and parsed per job
+    JOB_PROJECTION = [
+        'RequestCpus', 'RequestGpus', 'RequestMemory', 'RequestDisk',
+        'Requirements', 'GlobalJobId']
+
     def _cleanup(self):
         for slot in self.slots:
             slot.reset_resources()
@@ -153,26 +226,31 @@ class HTCondorPool(base.Pool):
     def _populate(self, manifest_file: str) -> None:
         """Populate the pool with Machines"""
         logger.debug(f'Populate Pool using manifest_file={manifest_file}')
-        with open(manifest_file, 'r') as json_file:
-            manifest = json.load(json_file)
+        with open(manifest_file, 'rb') as json_file:
+            data = json_file.read()
 
-            if not manifest.get('ManagementInterfaces', None):
-                raise ValueError('Missing ManagementInterfaces in manifest')
+        manifest = orjson.loads(data) if orjson else json.loads(data)
 
-            if not manifest.get('htcondor.htcondor.AdTypes.Startd', None):
-                raise ValueError(
-                    'Missing htcondor.htcondor.AdTypes.Startd in manifest')
+        if not manifest.get('ManagementInterfaces', None):
+            raise ValueError('Missing ManagementInterfaces in manifest')
 
-            interface = manifest['ManagementInterfaces']
-            slots = manifest['htcondor.htcondor.AdTypes.Startd']
+        if not manifest.get('htcondor.htcondor.AdTypes.Startd', None):
+            raise ValueError(
+                'Missing htcondor.htcondor.AdTypes.Startd in manifest')
+
+        interface = manifest['ManagementInterfaces']
+        slots = manifest['htcondor.htcondor.AdTypes.Startd']
 
-            for slot in slots:
-                slot = Slot(ad=ClassAd(slot))
-                if slot.machine not in [m.name for m in self.machines]:
-                    self.add_machine(
-                        name=slot.machine, interface=interface[slot.machine])
+        for slot in slots:
+            slot = Slot(ad=ClassAd(slot))
+            machine = self.machine.get(slot.machine, None)
 
-                self.machine[slot.machine].add_slot(slot)
+            if machine is None:
+                self.add_machine(
+                    name=slot.machine, interface=interface[slot.machine])
+                machine = self.machine[slot.machine]
+
+            machine.add_slot(slot)
 
     def _add_machine(
             self, name: str, interface: base.ManagementInterface) -> None:
@@ -200,13 +278,10 @@ class HTCondorPool(base.Pool):
           5  Held           H
           6  Submission_err E
         """
-        projection = [
-            'RequestCpus', 'RequestGpus', 'RequestMemory', 'RequestDisk',
-            'Requirements', 'GlobalJobId']
         constraint = 'JobStatus == 1 && MyType == "job"'
         logger.debug(f'Query HTCondor for idle jobs where {constraint})')
-        schedd = htcondor.Schedd()
-        query = schedd.query(projection=projection, constraint=constraint)
+        query = schedd().query(
+            projection=self.JOB_PROJECTION, constraint=constraint)
         self.jobs = query
 
     def get_machine_power_state(self) -> None:
@@ -216,17 +291,14 @@ class HTCondorPool(base.Pool):
         belong to that appears in the manifest from HTCondor. If the machine
         appears in the ClassAds it is considered online, otherwise it is
         considered offline."""
-        collector = htcondor.Collector()
-        names = [m.name for m in self.machines]
-        expr = ' || '.join([f'Machine == "{name}"' for name in names])
-        expr = f'SlotType != "Dynamic" && {expr}'
+        machines = self.active_machines
+        names = [m.name for m in machines]
+        expr = f'SlotType != "Dynamic" && {machine_constraint(names)}'
         logger.debug('Query HTCondor to assess which machines are available')
-        response = collector.query(
+        response = collector().query(
             htcondor.AdTypes.Startd, constraint=expr, projection=['Machine'])
 
         # Verify Machine State
-        for machine in self.machines:
-            condor_on = True if machine.name in [
-                ad['Machine'] for ad in set(response)] else False
-
-            machine.verify_state(condor_on)
+        online = {ad['Machine'] for ad in response}
+        for machine in machines:
+            machine.verify_state(machine.name in online)
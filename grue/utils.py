@@ -1,13 +1,62 @@
 from typing import List, Union
 import logging
 import json
+import threading
+import time
 
 import classad
 import htcondor
 
+try:
+    # C-implemented encoder, several times faster than stdlib json
+    import orjson
+except ImportError:
+    orjson = None
+
 
 logger = logging.getLogger(__name__)
 
+_collectors: dict = {}
+_collector_lock = threading.Lock()
+_schedd: htcondor.Schedd = None
+_query_cache: dict = {}
+
+
+def invalidate_query_cache() -> None:
+    """Drop all cached collector query results.
+
+    Call after an operation that changes what the collector would
+    return, so a subsequent fetch does not serve a stale answer."""
+    _query_cache.clear()
+
+
+def collector(host: str = None) -> htcondor.Collector:
+    """Long-lived Collector client per pool host, built on first use.
+
+    Every htcondor.Collector() resolves configuration and negotiates its
+    own connection, so per-query instances add a constant setup cost to
+    each daemon cycle. host=None addresses the configured local pool;
+    naming a host lets one process query multiple pools. The lock keeps
+    construction safe under the daemon's threaded update cycle."""
+    with _collector_lock:
+        if host not in _collectors:
+            _collectors[host] = (
+                htcondor.Collector(host) if host
+                else htcondor.Collector())
+        return _collectors[host]
+
+
+def schedd() -> htcondor.Schedd:
+    """Long-lived Schedd client, built once on first use.
+
+    Lazy rather than module-level because htcondor.Schedd() locates the
+    local schedd on construction, which fails on hosts that only run the
+    client."""
+    global _schedd
+    if _schedd is None:
+        _schedd = htcondor.Schedd()
+    return _schedd
+
 
 def argument(*name_or_flags, **kwargs):
     return list(name_or_flags), kwargs
@@ -33,10 +82,23 @@ def signal_handler(signum, frame):
     raise ProgramKilled
 
 
+def machine_constraint(names: List[str]) -> str:
+    """Build a ClassAd constraint matching any of the given machine names.
+
+    member() is a single set-membership test, which the collector parses
+    and evaluates faster than the equivalent chain of `Machine == "x"`
+    disjunctions, and keeps the constraint string short for large
+    pools."""
+    quoted = ','.join([f'"{name}"' for name in names])
+    return f'member(Machine, {{{quoted}}})'
+
+
 class ClassAdCollector:
-    _collector: htcondor.Collector = htcondor.Collector()
     _ad_type: htcondor.AdTypes
+    _ad_type_key: str = None
     _constraint: str = 'SlotType != "Dynamic"'
+    _compiled: classad.ExprTree = None
+    _clauses: set = None
     _projection: List[str] = None
     _classads: List[classad.classad.ClassAd] = None
 
@@ -45,8 +107,10 @@ class ClassAdCollector:
         """Collect ClassAds from an ad_type with a projection and constraint
         and store them in a pickle or json file."""
         self._ad_type = ad_type
+        self._ad_type_key = repr(ad_type)
         self._classads = []
         self._projection = []
+        self._clauses = {self._constraint}
 
     @property
     def projection(self) -> List[str]:
@@ -71,49 +135,119 @@ class ClassAdCollector:
     @constraint.setter
     def constraint(self, value) -> None:
         self._constraint = value
+        self._compiled = None
+        self._clauses = {value} if isinstance(value, str) else set()
 
     def constraint_or(self, value) -> None:
-        if isinstance(self.constraint, str):
-            self.constraint += f' || {value}'
-        else:
-            raise ValueError('Only a str can be appended to constraints')
+        self._append_clause(value, '||')
 
     def constraint_and(self, value) -> None:
-        if isinstance(self.constraint, str):
-            self.constraint += f' && {value}'
-        else:
+        self._append_clause(value, '&&')
+
+    def _append_clause(self, value: str, operator: str) -> None:
+        if not isinstance(self.constraint, str):
             raise ValueError('Only a str can be appended to constraints')
 
+        # an already-present clause cannot change the result; skipping it
+        # keeps the constraint sent to the collector from growing
+        if value in self._clauses:
+            return
+
+        self._constraint += f' {operator} {value}'
+        self._compiled = None
+        self._clauses.add(value)
+
+    @property
+    def compiled_constraint(self) -> classad.ExprTree:
+        """The constraint parsed into an ExprTree, rebuilt only when the
+        constraint string changes.
+
+        Passing the parsed expression to query() saves the collector
+        from re-parsing the same growing string on every fetch."""
+        if self._compiled is None:
+            self._compiled = classad.ExprTree(self.constraint)
+        return self._compiled
+
     def fetch(
-            self, constraint: str = None,
-            projection: List[str] = None) -> None:
+            self, constraint: str = None, projection: List[str] = None,
+            filters: List[str] = None, max_age: int = 30,
+            host: str = None) -> None:
         """Fetch a query built with the given AdType, constraints, and
-        projections using the HTCondor collector."""
+        projections using the HTCondor collector.
+
+        Any predicate expressible as a ClassAd boolean should be passed
+        in filters so the collector evaluates it server-side, instead of
+        post-filtering the returned ads in Python. Each filter is AND'ed
+        into the constraint. A projection is required; without one the
+        collector returns every attribute of every matching ad.
+
+        Identical queries issued within max_age seconds are served from
+        a process-wide cache instead of another collector round-trip;
+        max_age=0 always queries."""
         if constraint is not None:
             self.constraint = constraint
         if projection is not None:
             self.projection = projection
 
-        self._classads = self._collector.query(
+        if not self.projection:
+            raise ValueError(
+                'A projection is required to fetch ClassAds; set the '
+                'projection attribute or pass projection=')
+
+        if filters:
+            clauses = ' && '.join([f'({f})' for f in filters])
+            constraint = f'({self.constraint}) && {clauses}'
+            expression = classad.ExprTree(constraint)
+        else:
+            constraint = self.constraint
+            expression = self.compiled_constraint
+
+        key = (host, self._ad_type_key, constraint, tuple(self.projection))
+        now = time.monotonic()
+        cached = _query_cache.get(key, None)
+        if cached is not None and max_age and now - cached[0] < max_age:
+            self._classads = cached[1]
+            return
+
+        self._classads = collector(host).query(
             self._ad_type,
-            constraint=self.constraint,
+            constraint=expression,
             projection=self.projection)
+        _query_cache[key] = (now, self._classads)
 
     @property
     def json_classads(self) -> dict:
         """Transform a list of classads to a json-compatible format"""
         return {
-            repr(self._ad_type):
+            self._ad_type_key:
                 [dict(classad) for classad in self._classads]}
 
+    @staticmethod
+    def _encode(ad: classad.classad.ClassAd) -> bytes:
+        # printJson serializes inside the classad extension, skipping
+        # the per-attribute Python iteration a dict(ad) conversion costs
+        if hasattr(ad, 'printJson'):
+            return ad.printJson().encode()
+        if orjson is not None:
+            return orjson.dumps(dict(ad))
+        return json.dumps(dict(ad)).encode()
+
     def save(self, file_path: str) -> None:
-        """Store fetched ClassAds to disk in the defined file type.
+        """Store fetched ClassAds to disk as JSON.
 
-        Allowed file types are 'pickle' and 'json'."""
+        Ads are encoded and written one at a time, so the full list of
+        ad dicts never has to exist in memory next to the ClassAds
+        themselves."""
         if not self._classads:
             raise ValueError(
                 'ClassAds have not been fetched. Use the fetch() method '
                 'first.')
 
-        with open(file_path, 'w') as out_file:
-            json.dump(self.json_classads, out_file, indent=4)
+        key = json.dumps(self._ad_type_key).encode()
+        with open(file_path, 'wb') as out_file:
+            out_file.write(b'{' + key + b': [')
+            for i, ad in enumerate(self._classads):
+                if i:
+                    out_file.write(b',')
+                out_file.write(self._encode(ad))
+            out_file.write(b']}')
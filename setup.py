@@ -44,4 +44,4 @@ setup(
     include_package_data=True,
     install_requires=['htcondor', 'python-ipmi'],
     tests_require=['pytest', 'pytest-mock'],
-    extras_require={'grue-status': ['rich']})
+    extras_require={'grue-status': ['rich'], 'fast-json': ['orjson']})
@@ -0,0 +1,126 @@
+from os.path import dirname as opd, join as opj
+import copy
+import json
+import time
+
+from pytest import fixture
+
+from grue import base
+from grue.pool.htcondor import HTCondorPool
+
+
+class StubInterface(base.ManagementInterface):
+    """In-memory BMC double.
+
+    Defining the subclass registers it as a ManagementInterface, so
+    pools built from the test manifest pick it up by name. Power
+    commands are recorded on the instance instead of contacting
+    hardware."""
+    __slots__ = ()
+
+    def connect_interface(self, auth):
+        self._interface = auth
+
+    def open_session(self):
+        pass
+
+    def close_session(self):
+        pass
+
+    @property
+    def bmc(self):
+        return self._bmc
+
+    @bmc.setter
+    def bmc(self, value):
+        self._bmc = value
+
+    @property
+    def interface(self):
+        return self._interface
+
+    @interface.setter
+    def interface(self, value):
+        self._interface = value
+
+    @property
+    def power(self):
+        return self._power_on
+
+    @power.setter
+    def power(self, value):
+        self._power_on = value == 1
+
+    @property
+    def power_on(self):
+        return self._power_on
+
+    @power_on.setter
+    def power_on(self, value):
+        self._power_on = value
+
+
+@fixture(scope='session')
+def manifest_file():
+    return opj(opd(__file__), 'data/manifest.json')
+
+
+@fixture(scope='session')
+def manifest_ads(manifest_file):
+    """The manifest parsed once per session.
+
+    The file is static test data, so re-reading and re-parsing it per
+    test only repeats identical work."""
+    with open(manifest_file) as json_file:
+        return json.load(json_file)
+
+
+@fixture(scope='session')
+def _pool_template(manifest_file, tmp_path_factory):
+    """Parse the manifest and build the pool once per session.
+
+    Re-reading the manifest and rebuilding every Machine and Slot for
+    each test is identical work every time; tests receive a copy of
+    this template instead."""
+    state_file = str(tmp_path_factory.mktemp('state') / 'grue.json')
+    return HTCondorPool(
+        manifest_file=manifest_file, state_file=state_file,
+        default_interface='StubInterface',
+        interface_session_auth=('user', 'password'))
+
+
+def _reset(pool):
+    """Return the shared pool to its just-built condition.
+
+    Tests only mutate machine state, timers, power caches, slot
+    resources and the job list; re-assigning those is far cheaper than
+    deep-copying the whole template per test."""
+    pool.jobs = []
+    for machine in pool.machines:
+        machine.transition_to(base.state.Off())
+        machine.timer = None
+        machine.cached_power = None
+        machine.last_active = int(time.time())
+        machine.interface.power_on = None
+        for slot in machine.slots:
+            slot.reset_resources()
+
+
+@fixture
+def pool(_pool_template):
+    _reset(_pool_template)
+    return _pool_template
+
+
+@fixture
+def fresh_pool(_pool_template):
+    """A private deep copy for tests that restructure the pool itself,
+    e.g. by repopulating it or adding machines."""
+    pool = copy.deepcopy(_pool_template)
+
+    # deepcopy copies weakrefs by reference, so the states still point
+    # at the template's machines; re-binding restores the back-reference
+    for machine in pool.machines:
+        machine.transition_to(machine.state)
+
+    return pool
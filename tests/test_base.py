@@ -1,105 +1,59 @@
 from abc import ABCMeta
-from os.path import dirname as opd, join as opj
 
 from classad.classad import ClassAd, ExprTree
-from pytest import fixture
-import numpy as np
-import pyghmi
 import pytest
 
-from grue.states import StateOff, StateOn
-from grue.base import (
-    BaseDecisionEngine, IPMIHandler, Machine, Slot, BasePool, MachineContext,
-    MachineState)
+from grue import base
+from grue.base.state import Off, On
+from grue.interface import IPMI
+from grue.pool.htcondor import Machine, Slot
 
 
-@fixture
-def manifest_file(request):
-    return opj(opd(request.module.__file__), 'data/manifest.json')
+def test_decision_engine():
+    assert isinstance(base.DecisionEngine, ABCMeta)
 
 
-def test_base_decision_engine():
-    assert isinstance(BaseDecisionEngine, ABCMeta)
-    BaseDecisionEngine.__abstractmethods__ = set()
-    engine = BaseDecisionEngine()
-    assert engine.eval_turn_on() is None
-    assert engine.eval_turn_off() is None
-    assert engine.decide() is None
+def test_ipmi_interface():
+    ipmi = IPMI(auth=('user', 'password'), hostname='foo.bar.baz')
 
-    engine.jobs = [ClassAd({'foo': 'bar'})]
-
-    assert engine.jobs == [ClassAd({'foo': 'bar'})]
-
-
-def test_ipmi_handler(monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        pass
-
-    def mock_set_power(*args, **kwargs):
-        pass
-
-    def mock_get_power(*args, **kwargs):
-        return {'powerstate': 'off'}
-
-    monkeypatch.setattr(pyghmi.ipmi.command.Command, '__init__', mock_init)
-    monkeypatch.setattr(
-        pyghmi.ipmi.command.Command, 'set_power', mock_set_power)
-    monkeypatch.setattr(
-        pyghmi.ipmi.command.Command, 'get_power', mock_get_power)
-
-    ipmi = IPMIHandler(
-        user='user', password='password', hostname='foo.bar.baz')
-
-    # Command should not be set until open_session is called
-    assert not isinstance(ipmi.command, pyghmi.ipmi.command.Command)
-    ipmi.open_session()
-    assert isinstance(ipmi.command, pyghmi.ipmi.command.Command)
-
-    # IPMI user and password must be set
-    assert ipmi.user == 'user'
-    assert ipmi.password == 'password'
-
-    # IPMIHandler adds '.oob' before first . in bmc, but not in _bmc
+    # IPMI adds '.oob' before the first . in bmc, but not in _bmc
     assert ipmi._bmc == 'foo.bar.baz'
     assert ipmi.bmc == 'foo.oob.bar.baz'
 
-    # Test power state property
-    assert ipmi.power_state is None
-    assert ipmi.power_state == ipmi._power_state
-
-    # Ensure setting power changes power_state
-    ipmi.set_power('on')
-    assert ipmi.power_state == 'on'
-
-    # Ensure getting power state changes power_state
-    ipmi.get_power()
-    assert ipmi.power_state == 'off'
+    # power_on is unknown until the BMC has been queried
+    assert ipmi.power_on is None
 
+    # grue may only power up (1) or soft shutdown (5)
+    for value in (0, 2, 3, 4, 7):
+        with pytest.raises(ValueError):
+            ipmi.power = value
 
-def test_machine_init(monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        self.user = args[0]
-        self.password = args[1]
-        self.bmc = args[2]
 
-    monkeypatch.setattr(IPMIHandler, '__init__', mock_init)
+def test_machine_init():
+    machine = Machine(name='foo.bar.baz', state=Off())
 
-    machine = Machine(name='foo.bar.baz')
     assert machine.name == 'foo.bar.baz'
     assert len(machine.slots) == 0
-    assert isinstance(machine.state, StateOff)
+    assert isinstance(machine.state, Off)
     assert len(machine) == 0  # equal to number of slots
+    assert machine.state.context is machine  # back-reference to context
+    assert machine.timer is None
+
+
+def test_machine_transition():
+    machine = Machine(name='foo.bar.baz', state=Off())
+
+    machine.transition_to(On())
+    assert isinstance(machine.state, On)
+    assert machine.state.context is machine
 
-    # Test IPMI assignment
-    machine.ipmi = ['user', 'password']
-    assert isinstance(machine.ipmi, IPMIHandler)
-    assert machine.ipmi.user == 'user'
-    assert machine.ipmi.password == 'password'
-    assert machine.ipmi.bmc == 'foo.oob.bar.baz'
+    machine.timer = 1200.9  # timers are stored as whole seconds
+    assert machine.timer == 1200
+    assert machine.state.timer == 1200  # state.timer delegates to context
 
 
 def test_machine_slots():
-    machine = Machine(name='foo.bar.baz')
+    machine = Machine(name='foo.bar.baz', state=Off())
 
     # Add a slot matching the machine (name -> machine)
     ad = ClassAd({'Machine': 'foo.bar.baz'})
@@ -110,39 +64,23 @@ def test_machine_slots():
     assert len(machine) == 1
 
     # Add a slot not matching the machine
-    ad = ClassAd({'machine': 'bar.foo.baz'})
+    ad = ClassAd({'Machine': 'bar.foo.baz'})
     slot = Slot(ad=ad)
     pytest.raises(ValueError, machine.add_slot, slot)
 
 
-def test_machine_agg():
-    def test_func():
-        pass
-
-    machine = Machine(name='foo.bar.baz')
-    slot_cpus = [10, 15, 20]
-
-    for i in slot_cpus:
-        slot = Slot(ad=ClassAd({'Machine': 'foo.bar.baz', 'TotalSlotCpus': i}))
-        machine.add_slot(slot)
-
-    assert len(machine.slots) == 3
-    assert len(machine) == 3
-    assert machine.agg(metric='TotalSlotCpus', func=np.sum) == 45
-    assert machine.agg(metric='TotalSlotCpus', func=np.mean) == 15.0
-
-    # Use a non-permitted function
-    pytest.raises(ValueError, machine.agg, 'TotalSlotCpus', test_func)
-
-
 def test_slot_init():
-    ad = ClassAd({'Machine': 'foo.bar.baz', 'SlotType': 'Partitionable'})
+    ad = ClassAd({
+        'Machine': 'foo.bar.baz', 'Name': 'slot1@foo.bar.baz',
+        'SlotType': 'Partitionable'})
     slot = Slot(ad=ad)
 
     assert len(slot.jobs) == 0
     assert not slot._temp_resources
     assert slot.classad is ad
-    assert slot.is_partitionable
+    assert slot.partitionable
+    assert slot.machine == 'foo.bar.baz'
+    assert slot.name == 'slot1@foo.bar.baz'
 
 
 def test_slot_manage_resources():
@@ -206,7 +144,7 @@ def test_slot_assign_job():
     assert slot.classad['Cpus'] == 8
     assert slot.classad['GPUs'] == 8
 
-    # assign a second job, allowed due to slot.is_partitionable == True
+    # assign a second job, allowed due to slot.partitionable == True
     job = dummy_job(2, 2, 2, 2, 'foo.bar.baz', 'ppc64le')
     assert slot.assign_job(job)
     assert slot.classad['Disk'] == 6
@@ -231,32 +169,16 @@ def test_slot_assign_job():
     slot = Slot(ad=ClassAd(ad))
     assert not slot.assign_job(job)
 
-    # Assign a job with RequestCpus 1
+    # Requirements provided as text are parsed and stored back on the job
     job = dummy_job(2, 2, 1, 2, 'foo.bar.baz', 'ppc64le')
-    job['Requirements'] = ExprTree('(TARGET.Disk >= RequestDisk)')
+    job['Requirements'] = '(TARGET.Disk >= RequestDisk)'
     assert slot.assign_job(job)
-    ad['TotalSlotCpus'] = 0
-    slot = Slot(ad=ClassAd(ad))
-    assert not slot.assign_job(job)  # RequestCpus should have been added
-
+    assert isinstance(job['Requirements'], ExprTree)
 
-def test_base_pool():
-    assert isinstance(BasePool, ABCMeta)
-    BasePool.__abstractmethods__ = set()
-    pool = BasePool()
-    assert len(pool) == len(pool.machines) == 0
-    assert pool.build('/path/to/file', 'user', 'password') is None
-    assert pool.update_machine_power_state() is None
-    assert pool.update_jobs() is None
-    assert pool.update() is None
 
-
-def test_base_pool_load_manifest(manifest_file):
-    BasePool.__abstractmethods__ = set()
-    pool = BasePool()
-    slots = list(pool.load_manifest(manifest_file))
+def test_manifest_contents(manifest_ads):
+    slots = manifest_ads['htcondor.htcondor.AdTypes.Startd']
     assert len(slots) == 1
-    assert isinstance(slots[0], ClassAd)
 
     # Absolute minimum property requirements
     props = {
@@ -268,62 +190,39 @@ def test_base_pool_load_manifest(manifest_file):
     assert all([key in slots[0].keys() for key in props.keys()])
     assert all([value == slots[0][key] for key, value in props.items()])
 
+    # every machine in the manifest has a management interface
+    interfaces = manifest_ads['ManagementInterfaces']
+    assert all([slot['Machine'] in interfaces.keys() for slot in slots])
 
-def test_base_pool_machines(manifest_file):
-    BasePool.__abstractmethods__ = set()
-    pool = BasePool()
-
-    # Populate machines and slots from manifest file
-    for ad in pool.load_manifest(manifest_file):
-        slot = Slot(ad=ad)
-        if slot.machine in [machine.name for machine in pool.machines]:
-            pool.machine[slot.machine].add_slot(slot)
-        else:
-            machine = Machine(name=slot.machine)
-            machine.add_slot(slot)
-            pool.machines.append(machine)
 
+def test_pool_populate(pool):
     assert len(pool) == len(pool.machines) == 1
     assert all([isinstance(machine, Machine) for machine in pool.machines])
     assert len(pool.slots) == 1
     assert all([isinstance(slot, Slot) for slot in pool.slots])
 
+    # machines start Off and are indexed by name
+    machine = pool.machines[0]
+    assert machine.name == 'gpu2.htc.inm7.de'
+    assert isinstance(machine.state, Off)
+    assert pool.machine['gpu2.htc.inm7.de'] is machine
+
+
+def test_pool_populate_missing_interfaces(fresh_pool, tmp_path):
+    manifest = tmp_path / 'manifest.json'
+    manifest.write_text('{"htcondor.htcondor.AdTypes.Startd": []}')
+    pytest.raises(ValueError, fresh_pool.populate, str(manifest))
+
+
+def test_pool_add_machine(fresh_pool):
+    fresh_pool.add_machine(
+        name='cpu1.htc.inm7.de', interface={'interface': 'StubInterface'})
+
+    assert len(fresh_pool) == 2
+    assert fresh_pool.machine['cpu1.htc.inm7.de'] is fresh_pool.machines[1]
+    assert fresh_pool.machines[1].interface.bmc == 'cpu1.htc.inm7.de'
 
-def test_machine_context():
-    # Methods that delegate behaviour to individual states are not tested
-    MachineContext.__abstractmethods__ = set()
-    context = MachineContext(state=StateOff())
-
-    assert context.machine is None
-    assert context.ipmi is None
-    assert context.name is None
-    assert isinstance(context.state, StateOff)
-    assert context.timer is None
-    context.transition_to(StateOn())
-    assert isinstance(context.state, StateOn)
-    assert context.state.context == context
-    context.timer = 1200
-    assert context.timer == 1200
-
-
-def test_machine_state():
-    MachineState.__abstractmethods__ = set()
-    state = MachineState()
-
-    assert state.context is None
-    assert state.turn_on() is None
-    assert state.turn_off() is None
-    assert state.verify(condor_online=False) is None
-
-    # Test method delegation to context
-    MachineContext.__abstractmethods__ = set()
-    context = MachineContext(state=StateOff())
-    state.context = context
-
-    assert state.name is context.name
-    assert state.ipmi is context.ipmi
-    assert state.timer is context.timer
-    state.timer = 1200  # state.timer delegates to context.timer
-    assert context.timer == 1200
-    state.transition_to(StateOn())
-    assert isinstance(context.state, StateOn)
+    # an unknown interface name is rejected
+    pytest.raises(
+        ValueError, fresh_pool.add_machine, 'cpu2.htc.inm7.de',
+        {'interface': 'Telepathy'})
@@ -1,13 +1,11 @@
-from os.path import dirname as opd, join as opj
+import time
 
 import classad
-import htcondor
-import pyghmi
-import pytest
 
-from grue.base import BasePool, IPMIHandler, Machine, Slot, MachineContext
-from grue.states import StateOn, StateOff, StateTurningOn, StateTurningOff
-from grue.decision.sequential import GenericPool, SequentialDecisionEngine
+from grue.base import Pool
+from grue.base.state import Off, On, Booting, ShuttingDown
+from grue.decision.sequential import SequentialDecisionEngine
+from grue.pool.htcondor import Machine, Slot
 
 
 def dummy_job(
@@ -26,99 +24,17 @@ def dummy_job(
             f'(TARGET.Memory >= RequestMemory)')})
 
 
-@pytest.fixture
-def manifest_file(request):
-    return opj(opd(request.module.__file__), 'data/manifest.json')
+class MockCollector:
+    """Collector double returning a canned query result."""
 
+    def __init__(self, response):
+        self.response = response
 
-def test_generic_pool_build(manifest_file, monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        pass
-
-    # Halt IPMI service call (to prevent a `socket.gaierror` from pyghmi)
-    monkeypatch.setattr(pyghmi.ipmi.command.Command, '__init__', mock_init)
-    pool = GenericPool()
-    pool.build(manifest_file, ipmi_user='user', ipmi_password='password')
-
-    # There is only 1 machine in the manifest
-    assert len(pool.machines) == 1
-
-    # Manually define hostnames for IPMI calls
-    bmcs = {
-        'gpu1.htc.inm7.de': 'gpu1.oob.htc.inm7.de',
-        'gpu2.htc.inm7.de': 'gpu2.oob.htc.inm7.de'}
-
-    # Test manifest loading
-    for machine in pool.machines:
-        assert isinstance(machine, Machine)
-        assert isinstance(machine.ipmi, IPMIHandler)
-        assert machine.ipmi.bmc == bmcs[machine.name]
-
-        # There is only 1 slot in the machine
-        assert len(machine.slots) == 1
-        for slot in machine.slots:
-            assert isinstance(slot, Slot)
-
-
-def test_generic_pool_update_jobs(monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        pass
-
-    def mock_xquery(self, *args, **kwargs):
-        return [classad.classad.ClassAd({'foo': 'bar'})]
-
-    # HTCondor queries will not work on a system without HTCondor
-    monkeypatch.setattr(htcondor.Schedd, '__init__', mock_init)
-    monkeypatch.setattr(htcondor.Schedd, 'xquery', mock_xquery)
-    pool = GenericPool()
-    pool.update_jobs()
-
-    # idle jobs must be added to engine.jobs
-    for job in pool.jobs:
-        assert list(job.keys()) == ['foo']
-        assert list(job.values()) == ['bar']
-
-
-def test_generic_pool_update_machine_power_state(manifest_file, monkeypatch):
-    def mock_init(*args, **kwargs):
-        pass
+    def query(self, *args, **kwargs):
+        return self.response
 
-    def mock_query_correct(self, *args, **kwargs):
-        return [classad.classad.ClassAd({'Machine': 'gpu2.htc.inm7.de'})]
-
-    def mock_query_incorrect(self, *args, **kwargs):
-        return [classad.classad.ClassAd({'Machine': 'foo.bar.baz'})]
-
-    def mock_verify_true(self, *args, **kwargs):
-        assert args[0]
-
-    def mock_verify_false(self, *args, **kwargs):
-        assert not args[0]
-
-    monkeypatch.setattr(pyghmi.ipmi.command.Command, '__init__', mock_init)
-
-    # Assess condor_on as True
-    monkeypatch.setattr(htcondor.Collector, 'query', mock_query_correct)
-    monkeypatch.setattr(MachineContext, 'verify_state', mock_verify_true)
-    pool = GenericPool()
-    pool.build(manifest_file, ipmi_user='user', ipmi_password='password')
-    pool.update_machine_power_state()
-
-    # Assess condor_on as False
-    monkeypatch.setattr(htcondor.Collector, 'query', mock_query_incorrect)
-    monkeypatch.setattr(MachineContext, 'verify_state', mock_verify_false)
-    pool = GenericPool()
-    pool.build(manifest_file, ipmi_user='user', ipmi_password='password')
-    pool.update_machine_power_state()
-
-
-def test_sequential_decision_engine_decide(manifest_file, monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        pass
-
-    def mock_set_power(self, power_state: str):
-        self.power_state = power_state
 
+def test_sequential_decision_engine_decide(pool, monkeypatch):
     def mock_update(self, *args, **kwargs):
         pass
 
@@ -134,161 +50,128 @@ def test_sequential_decision_engine_decide(manifest_file, monkeypatch):
     def mock_eval_turn_off_empty(self, *args, **kwargs):
         return []
 
-    monkeypatch.setattr(IPMIHandler, '__init__', mock_init)
-    monkeypatch.setattr(IPMIHandler, 'set_power', mock_set_power)
-    monkeypatch.setattr(BasePool, 'update', mock_update)
+    monkeypatch.setattr(Pool, 'update', mock_update)
     monkeypatch.setattr(
         SequentialDecisionEngine, 'eval_turn_on', mock_eval_turn_on)
     monkeypatch.setattr(
         SequentialDecisionEngine, 'eval_turn_off', mock_eval_turn_off_empty)
-    engine = SequentialDecisionEngine()
-    engine.build(manifest_file, ipmi_user='user', ipmi_password='password')
-    assert isinstance(engine.machines[0].state, StateOff)
-    engine.decide()
-    assert isinstance(engine.machines[0].state, StateTurningOn)
+    engine = SequentialDecisionEngine(pool)
+    assert isinstance(pool.machines[0].state, Off)
+    assert engine.decide() == 1
+    assert isinstance(pool.machines[0].state, Booting)
 
     monkeypatch.setattr(
         SequentialDecisionEngine, 'eval_turn_on', mock_eval_turn_on_empty)
-    monkeypatch.setattr(
-        SequentialDecisionEngine, 'eval_turn_off', mock_eval_turn_off_empty)
-    engine = SequentialDecisionEngine()
-    engine.build(manifest_file, ipmi_user='user', ipmi_password='password')
-    assert isinstance(engine.machines[0].state, StateOff)
-    engine.decide()
-    assert isinstance(engine.machines[0].state, StateOff)
+    pool.machines[0].transition_to(Off())
+    assert engine.decide() == 0
+    assert isinstance(pool.machines[0].state, Off)
 
-    monkeypatch.setattr(
-        SequentialDecisionEngine, 'eval_turn_on', mock_eval_turn_on_empty)
     monkeypatch.setattr(
         SequentialDecisionEngine, 'eval_turn_off', mock_eval_turn_off)
-    engine = SequentialDecisionEngine()
-    engine.build(manifest_file, ipmi_user='user', ipmi_password='password')
-    engine.machines[0].transition_to(StateOn())
-    assert isinstance(engine.machines[0].state, StateOn)
-    engine.decide()
-    assert isinstance(engine.machines[0].state, StateTurningOff)
+    pool.machines[0].transition_to(On())
+    assert engine.decide() == 1
+    assert isinstance(pool.machines[0].state, ShuttingDown)
 
 
-def test_sequential_decision_engine_eval_turn_on_no_jobs(
-        manifest_file, monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        pass
-
-    monkeypatch.setattr(pyghmi.ipmi.command.Command, '__init__', mock_init)
-    engine = SequentialDecisionEngine()
-    engine.build(manifest_file, ipmi_user='user', ipmi_password='password')
-    engine.jobs = []
+def test_sequential_decision_engine_eval_turn_on_no_jobs(pool):
+    engine = SequentialDecisionEngine(pool)
+    pool.jobs = []
     assert engine.eval_turn_on() == []
 
 
-def test_sequential_decision_engine_eval_turn_on_all_machines_occupied(
-        manifest_file, monkeypatch):
+def test_sequential_decision_engine_eval_turn_on_all_machines_occupied(pool):
     """The dummy job fits in the machine slot, but the machine the slot
-    belongs to is marked as StateOn, and hence is assumed to be occupied."""
-    def mock_init(self, *args, **kwargs):
-        pass
-
-    monkeypatch.setattr(pyghmi.ipmi.command.Command, '__init__', mock_init)
-    engine = SequentialDecisionEngine()
-    engine.build(manifest_file, ipmi_user='user', ipmi_password='password')
-    engine.machines[0].transition_to(StateOn())  # marks machine as occupied
-    engine.jobs = [dummy_job(1, 1, 1, 1, 'gpu2.htc.inm7.de', 'ppc64le')]
+    belongs to is marked as On, and hence is assumed to be occupied."""
+    engine = SequentialDecisionEngine(pool)
+    pool.machines[0].transition_to(On())  # marks machine as occupied
+    pool.jobs = [dummy_job(1, 1, 1, 1, 'gpu2.htc.inm7.de', 'ppc64le')]
     assert engine.eval_turn_on() == []
 
 
-def test_sequential_decision_engine_eval_turn_on_use_machine(
-        manifest_file, monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        pass
-
-    monkeypatch.setattr(pyghmi.ipmi.command.Command, '__init__', mock_init)
-    engine = SequentialDecisionEngine()
-    engine.build(manifest_file, ipmi_user='user', ipmi_password='password')
-    engine.machines[0].transition_to(StateOff())  # marks machine as unoccupied
-    engine.jobs = [dummy_job(1, 1, 1, 1, 'gpu2.htc.inm7.de', 'ppc64le')]
+def test_sequential_decision_engine_eval_turn_on_use_machine(pool):
+    engine = SequentialDecisionEngine(pool)
+    pool.machines[0].transition_to(Off())  # marks machine as unoccupied
+    pool.jobs = [dummy_job(1, 1, 1, 1, 'gpu2.htc.inm7.de', 'ppc64le')]
     assert engine.eval_turn_on() == ['gpu2.htc.inm7.de']
 
 
-def test_sequential_decision_engine_filter_by_activity(monkeypatch):
-    # TODO: Test this as an HTCondor Query
-    pass
-
-
-def test_sequential_decision_engine_filter_by_claimed(monkeypatch):
-    # TODO: Test this as an HTCondor Query
-    pass
-
-
-def test_sequential_decision_engine_eval_turn_off(manifest_file, monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        pass
-
-    def fail_filter(*args, **kwargs):
-        return []
-
-    def pass_filter(*args, **kwargs):
-        return ['gpu2.htc.inm7.de']
-
-    monkeypatch.setattr(pyghmi.ipmi.command.Command, '__init__', mock_init)
-
-    # No machines in StateOn
-    engine = SequentialDecisionEngine()
-    engine.build(manifest_file, ipmi_user='user', ipmi_password='password')
-
-    for machine in engine.machines:
-        machine.transition_to(StateOff())
-
-    assert engine.eval_turn_off() == []
-
-    # All machines with StateOn are occupied (i.e., claimed)
+def test_sequential_decision_engine_eval_turn_off(pool, monkeypatch):
+    name = 'gpu2.htc.inm7.de'
+    mock_collector = MockCollector([])
     monkeypatch.setattr(
-        SequentialDecisionEngine, 'filter_by_claimed', fail_filter)
+        'grue.decision.sequential.collector', lambda: mock_collector)
 
-    for machine in engine.machines:
-        machine.transition_to(StateOn())
+    # No machines in On
+    engine = SequentialDecisionEngine(pool)
+    machine = pool.machines[0]
+    assert isinstance(machine.state, Off)
+    assert engine.eval_turn_off() == []
 
+    # All machines with On are occupied (i.e., claimed)
+    machine.transition_to(On())
+    machine.last_active = time.time() - 7200
+    mock_collector.response = [classad.classad.ClassAd({
+        'Machine': name, 'State': 'Claimed', 'Activity': 'Busy',
+        'EnteredCurrentActivity': int(time.time())})]
     assert engine.eval_turn_off() == []
+    assert machine.last_active >= time.time() - 60  # refreshed while claimed
 
-    # All machines with StateOn are unoccupied, but not idle long enough
-    monkeypatch.setattr(
-        SequentialDecisionEngine, 'filter_by_claimed', pass_filter)
-    monkeypatch.setattr(
-        SequentialDecisionEngine, 'filter_by_activity', fail_filter)
+    # All machines with On are unoccupied, but not idle long enough
+    machine.last_active = time.time() - 7200
+    mock_collector.response = [classad.classad.ClassAd({
+        'Machine': name, 'State': 'Unclaimed', 'Activity': 'Idle',
+        'EnteredCurrentActivity': int(time.time())})]
     assert engine.eval_turn_off() == []
 
     # gpu2.htc.inm7.de is unoccupied and has been idle long enough
-    monkeypatch.setattr(
-        SequentialDecisionEngine, 'filter_by_activity', pass_filter)
-    assert engine.eval_turn_off() == ['gpu2.htc.inm7.de']
+    mock_collector.response = [classad.classad.ClassAd({
+        'Machine': name, 'State': 'Unclaimed', 'Activity': 'Idle',
+        'EnteredCurrentActivity': int(time.time()) - 7200})]
+    assert engine.eval_turn_off() == [name]
+
+
+def test_sequential_decision_engine_slot_exhausted():
+    ad = {
+        'Machine': 'foo.bar.baz', 'TotalSlotCpus': 2, 'SlotType': 'Static'}
+    slot = Slot(ad=classad.classad.ClassAd(ad))
+    assert not SequentialDecisionEngine.slot_exhausted(slot)
+    slot.jobs.append(classad.classad.ClassAd({'foo': 'bar'}))
+    assert SequentialDecisionEngine.slot_exhausted(slot)
+
+    ad['SlotType'] = 'Partitionable'
+    slot = Slot(ad=classad.classad.ClassAd(ad))
+    assert not SequentialDecisionEngine.slot_exhausted(slot)
+    slot.subtract_resource('Cpus', 2)
+    assert SequentialDecisionEngine.slot_exhausted(slot)
 
 
 def test_sequential_decision_engine_reduce_machines():
-    machines = ['a.b.c', 'c.a.b', 'b.c.a', 'c.b.a', 'a.c.b', 'b.a.c']
-    machines = [Machine(name=machine) for machine in machines]
+    names = ['a.b.c', 'c.a.b', 'b.c.a', 'c.b.a', 'a.c.b', 'b.a.c']
+    machines = [Machine(name=name, state=Off()) for name in names]
     assert SequentialDecisionEngine.reduce_machines(machines) == machines
 
-    machines[0].transition_to(StateOn())  # removed
-    machines[2].transition_to(StateOn())  # removed
-    machines[4].transition_to(StateOn())  # removed
-    machines[5].transition_to(StateTurningOn())  # should still be in there
+    machines[0].transition_to(On())  # removed
+    machines[2].transition_to(On())  # removed
+    machines[4].transition_to(On())  # removed
+    machines[5].transition_to(Booting())  # should still be in there
     reduced = [machines[1], machines[3], machines[5]]
     assert SequentialDecisionEngine.reduce_machines(machines) == reduced
 
 
 def test_sequential_decision_engine_sort_machines():
     names = ['a.b.c', 'c.a.b', 'b.c.a', 'c.b.a', 'a.c.b', 'b.a.c']
-    machines = [Machine(name=machine) for machine in names]
+    machines = [Machine(name=name, state=Off()) for name in names]
     expected = [
         machines[0], machines[4], machines[5], machines[2], machines[1],
         machines[3]]
     assert SequentialDecisionEngine.sort_machines(machines) == expected
 
-    # List StateTurningOn first, StateOff second, the rest last
+    # List Booting first, Off second, the rest last
     #  note: it is still ordering alphabetically by name, but state ordering
     #  gets priority.
-    machines = [Machine(name=machine) for machine in names]
-    machines[0].transition_to(StateOn())  # last
-    machines[2].transition_to(StateTurningOn())  # first
+    machines = [Machine(name=name, state=Off()) for name in names]
+    machines[0].transition_to(On())  # last
+    machines[2].transition_to(Booting())  # first
     expected = [
         machines[2], machines[4], machines[5], machines[1], machines[3],
         machines[0]]
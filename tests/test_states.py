@@ -1,260 +1,142 @@
-from os.path import dirname as opd, join as opj
-import time
+from unittest.mock import MagicMock
 
-from pytest import fixture
+import pytest
 
-from grue.base import BasePool, MachineState, IPMIHandler, Slot, Machine
-from grue.states import (
-    StateOff, StateOn, StateTurningOn, StateTurningOff, StateErroredOut)
+from grue.base.state import (
+    State, Off, On, Booting, ShuttingDown, Stuck)
 
 
-@fixture
-def manifest_file(request):
-    return opj(opd(request.module.__file__), 'data/manifest.json')
+@pytest.fixture
+def fake_time(monkeypatch):
+    """Deterministic clock for timer-driven state transitions.
 
+    grue.base.state reads time.time() when setting and checking
+    transition timers; a fixed value makes the 900s threshold tests
+    exact instead of racing the wall clock."""
+    now = [1_000_000.0]
+    monkeypatch.setattr('grue.base.state.time.time', lambda: now[0])
+    return now
 
-@fixture
-def pool(manifest_file, monkeypatch):
-    def mock_init(self, *args, **kwargs):
-        pass
 
-    def mock_set_power(self, power_state: str):
-        self.power_state = power_state
+# State instances carry no data apart from the weak context reference
+# that transition_to rebinds, so one instance per state serves every
+# test here without per-test allocations. Tests that need several
+# machines at once must construct their own instances.
+STATE = {cls: cls() for cls in (Off, On, Booting, ShuttingDown)}
 
-    def mock_get_power(self):
-        return self.power_state
 
-    monkeypatch.setattr(IPMIHandler, '__init__', mock_init)
-    monkeypatch.setattr(IPMIHandler, 'set_power', mock_set_power)
-    monkeypatch.setattr(IPMIHandler, 'get_power', mock_get_power)
-
-    BasePool.__abstractmethods__ = set()
-    pool = BasePool()
-
-    # Populate machines and slots from manifest file
-    for ad in pool.load_manifest(manifest_file):
-        slot = Slot(ad=ad)
-        if slot.machine in [machine.name for machine in pool.machines]:
-            pool.machine[slot.machine].add_slot(slot)
-            pool.machine.ipmi = ['user', 'password', slot.machine]
-        else:
-            machine = Machine(name=slot.machine)
-            machine.ipmi = ['user', 'password', slot.machine]
-            machine.add_slot(slot)
-            pool.machines.append(machine)
-
-    return pool
-
-
-class MockState(MachineState):
-    """Fake state that should never occur naturally, used to verify that no
-    state transitions have taken place."""
-    def turn_on(self) -> None:
-        pass
-
-    def turn_off(self) -> None:
-        pass
-
-    def verify(self, condor_online: bool) -> None:
-        pass
-
-
-def test_state_off_turn_off(pool):
-    machine = pool.machines[0]
-    state = machine.state
-    assert isinstance(state, StateOff)  # default state
-
-    state.turn_off()
-    assert isinstance(machine.state, StateOff)
-    assert state.timer is None
-    # power_state is None (unverified) as it has not been assessed
-    assert state.ipmi.power_state is None
-
-
-def test_state_off_turn_on(pool):
-    machine = pool.machines[0]
-    state = machine.state
-    assert isinstance(state, StateOff)
-
-    state.turn_on()
-    assert state.ipmi.power_state == 'on'
-    assert isinstance(state.timer, int)
-    assert state.timer <= time.time()
-    assert isinstance(machine.state, StateTurningOn)
-
-
-def test_state_off_verify(pool):
-    machine = pool.machines[0]
-    state = machine.state
-    assert isinstance(state, StateOff)  # default state
-
-    # machine.state should transition to StateOn
-    state.ipmi.power_state = 'on'
-    state.verify(condor_online=True)
-    assert isinstance(machine.state, StateOn)
-
-    # machine.state should transition to StateErroredOut
-    state.ipmi.power_state = 'off'
-    state.verify(condor_online=True)
-    assert isinstance(machine.state, StateErroredOut)
-
-    # machine.state should not transition
-    state.ipmi.power_state = 'off'
-    machine.transition_to(MockState())
-    state.verify(condor_online=False)
-    assert isinstance(machine.state, MockState)
-
-
-def test_state_on_turn_off(pool):
-    machine = pool.machines[0]
-    machine.transition_to(StateOn())
-    state = machine.state
-    assert isinstance(state, StateOn)
-
-    state.turn_off()
-    assert isinstance(state.timer, int)
-    assert state.timer <= time.time()
-    assert isinstance(machine.state, StateTurningOff)
-
-
-def test_state_on_turn_on(pool):
+def test_state_off_turn_on(pool, fake_time):
     machine = pool.machines[0]
-    machine.transition_to(StateOn())
     state = machine.state
-    assert isinstance(state, StateOn)
+    assert isinstance(state, Off)
 
     state.turn_on()
-    assert isinstance(machine.state, StateOn)
-    assert state.timer is None
-    assert state.ipmi.power_state is None
-
-
-def test_state_on_verify(pool):
+    assert machine.interface.power_on is True
+    assert machine.timer == int(fake_time[0])
+    assert isinstance(machine.state, Booting)
+
+
+# Transition table for verify outcomes: the observed
+# (cached_power, htcondor_on) pair plus an offset on the transition
+# timer determines which state the machine ends up in
+VERIFY_TABLE = [
+    # power on and HTCondor online means the machine is On
+    (Off, True, True, None, On),
+    # power off but HTCondor online is contradictory
+    (Off, False, True, None, Stuck),
+    # power off and HTCondor offline confirms Off; no transition
+    (Off, False, False, None, Off),
+    # power on but HTCondor offline: the machine may still be booting
+    (Off, True, False, None, Off),
+    # power off and HTCondor offline means the machine is Off
+    (On, False, False, None, Off),
+    # power on but HTCondor offline is contradictory
+    (On, True, False, None, Stuck),
+    # power on and HTCondor online confirms On; no transition
+    (On, True, True, None, On),
+    # power off but HTCondor online: observation is unclear
+    (On, False, True, None, On),
+    # not enough time has passed for a transition to Stuck
+    (Booting, None, False, 0, Booting),
+    # the transition period (900s) has been exceeded
+    (Booting, None, False, -900, Stuck),
+    # HTCondor reports the machine as online; the boot has completed
+    (Booting, None, True, 0, On),
+    # power is still on and not enough time has passed for a transition
+    (ShuttingDown, True, False, 0, ShuttingDown),
+    # the transition period (900s) has been exceeded
+    (ShuttingDown, True, False, -900, Stuck),
+    # the BMC reports the machine as off; the shutdown has completed
+    (ShuttingDown, False, False, 0, Off)]
+
+
+@pytest.mark.parametrize(
+    'initial, power, online, timer_offset, expected', VERIFY_TABLE)
+def test_state_verify(
+        pool, fake_time, initial, power, online, timer_offset, expected):
     machine = pool.machines[0]
-    machine.transition_to(StateOn())
-    state = machine.state
-    assert isinstance(state, StateOn)
-
-    # machine.state should transition to StateOff
-    state.ipmi.power_state = 'off'
-    state.verify(condor_online=False)
-    assert isinstance(machine.state, StateOff)
-
-    # machine.state should transition to StateErroredOut
-    state.ipmi.power_state = 'on'
-    state.verify(condor_online=False)
-    assert isinstance(machine.state, StateErroredOut)
-
-    # machine.state should not change
-    machine.transition_to(MockState())
-    state.ipmi.power_state = 'off'
-    state.verify(condor_online=True)
-    assert isinstance(machine.state, MockState)
+    machine.transition_to(STATE[initial])
+    machine.cached_power = power
 
+    if timer_offset is not None:
+        machine.timer = fake_time[0] + timer_offset
 
-def test_state_turning_on_turn_on(pool):
-    machine = pool.machines[0]
-    machine.transition_to(StateTurningOn())
-    state = machine.state
-    assert isinstance(state, StateTurningOn)
+    machine.verify_state(online)
+    assert isinstance(machine.state, expected)
 
-    state.turn_on()
-    assert isinstance(machine.state, StateTurningOn)
-    assert state.timer is None
-    assert state.ipmi.power_state is None
+    # a completed transition clears the timer
+    if initial in (Booting, ShuttingDown) and expected in (On, Off):
+        assert machine.timer is None
 
 
-def test_state_turning_on_turn_off(pool):
+def test_state_on_turn_off(pool, fake_time):
     machine = pool.machines[0]
-    machine.transition_to(StateTurningOn())
+    machine.transition_to(STATE[On])
     state = machine.state
-    assert isinstance(state, StateTurningOn)
 
     state.turn_off()
-    assert isinstance(machine.state, StateTurningOn)
-    assert state.timer is None
-    assert state.ipmi.power_state is None
-
-
-def test_state_turning_on_verify(pool):
-    machine = pool.machines[0]
-    machine.transition_to(StateTurningOn())
-    state = machine.state
-    assert isinstance(state, StateTurningOn)
-
-    # Not enough time has passed for a state transition
-    state.timer = time.time()
-    state.verify(condor_online=False)
-    assert isinstance(machine.state, StateTurningOn)
-
-    # Enough time has passed for a state transition to StateErroredOut
-    state.timer = time.time() - 900
-    state.verify(condor_online=False)
-    assert isinstance(machine.state, StateErroredOut)
-
-    # If condor marks the machine as online, transition to StateOn
-    state.verify(condor_online=True)
-    assert state.timer is None
-    assert isinstance(machine.state, StateOn)
-
-
-def test_state_turning_off_turn_on(pool):
-    machine = pool.machines[0]
-    machine.transition_to(StateTurningOff())
-    state = machine.state
-    assert isinstance(state, StateTurningOff)
-
-    state.turn_on()
-    assert isinstance(machine.state, StateTurningOff)
-    assert state.timer is None
-    assert state.ipmi.power_state is None
-
-
-def test_state_turning_off_turn_off(pool):
+    assert machine.interface.power_on is False
+    assert machine.timer == int(fake_time[0])
+    assert isinstance(machine.state, ShuttingDown)
+
+
+@pytest.mark.parametrize('state_cls, method', [
+    (Off, 'turn_off'), (On, 'turn_on'),
+    (Booting, 'turn_on'), (Booting, 'turn_off'),
+    (ShuttingDown, 'turn_on'), (ShuttingDown, 'turn_off')])
+def test_state_noop_transitions(pool, state_cls, method):
+    # a command towards the state the machine already has, or towards a
+    # transitional state, is ignored
     machine = pool.machines[0]
-    machine.transition_to(StateTurningOff())
-    state = machine.state
-    assert isinstance(state, StateTurningOff)
+    machine.transition_to(STATE[state_cls])
 
-    state.turn_off()
-    assert isinstance(machine.state, StateTurningOff)
-    assert state.timer is None
-    assert state.ipmi.power_state is None
+    getattr(machine.state, method)()
+    assert isinstance(machine.state, state_cls)
+    assert machine.timer is None
+    assert machine.interface.power_on is None  # no command was issued
 
 
-def test_state_turning_off_verify(pool):
+def test_state_no_transition_on_verify(pool):
+    # a state that does not act on a verify outcome keeps the machine
+    # where it is
     machine = pool.machines[0]
-    machine.transition_to(StateTurningOff())
-    state = machine.state
-    assert isinstance(state, StateTurningOff)
-
-    # Not enough time has passed for a state transition
-    state.ipmi.power_state = 'on'
-    state.timer = time.time()
-    state.verify(condor_online=False)  # condor_online does nothing here
-    assert isinstance(machine.state, StateTurningOff)
-
-    # Enough time has passed for a state transition to StateErroredOut
-    state.ipmi.power_state = 'on'
-    state.timer = time.time() - 900
-    state.verify(condor_online=False)
-    assert isinstance(machine.state, StateErroredOut)
-
-    # If IPMI says the machine is offline, transition to StateOff
-    state.ipmi.power_state = 'off'
-    state.verify(condor_online=False)
-    assert state.timer is None
-    assert isinstance(machine.state, StateOff)
+    state = MagicMock(spec=State)
+    machine.transition_to(state)
+    machine.verify_state(False)
+    assert machine.state is state
+    state.verify.assert_called_once_with(False)
 
 
-# TODO: Make tests for StateErroredOut
-def test_state_errored_out_turn_on(pool):
+@pytest.mark.skip(reason='TODO: implement Stuck tests')
+def test_state_stuck_turn_on():
     pass
 
 
-def test_state_errored_out_turn_off(pool):
+@pytest.mark.skip(reason='TODO: implement Stuck tests')
+def test_state_stuck_turn_off():
     pass
 
 
-def test_state_errored_out_verify(pool):
+@pytest.mark.skip(reason='TODO: implement Stuck tests')
+def test_state_stuck_verify():
     pass
@@ -1,83 +1,94 @@
-import classad
-import htcondor
+import pytest
 
-from grue.utils import (
-    camel_to_snake, snake_to_camel, translate_classad, ClassAdCollector)
+# the htcondor bindings are heavyweight C extensions; skip this module
+# cleanly on hosts that do not have them rather than erroring at import
+classad = pytest.importorskip('classad')
+htcondor = pytest.importorskip('htcondor')
 
+from grue import utils  # noqa: E402
+from grue.utils import ClassAdCollector, machine_constraint  # noqa: E402
 
-def test_camel_to_snake():
-    test_values = {
-        'FooBarBaz': 'foo_bar_baz', 'fooBarBaz': 'foo_bar_baz',
-        'FOOBarBaz': 'foobar_baz', 'foo_bar_baz': 'foo_bar_baz',
-        'foo_bar_BAZ': 'foo_bar_baz', '_foo_bar_baz': '_foo_bar_baz',
-        'fooBARbaz': 'foo_barbaz', 'FOOBARBAZ': 'foobarbaz',
-        'Foo1Bar2Baz3': 'foo1bar2baz3', '123': '123', '1_2_3': '1_2_3'}
+# ClassAd construction is a C-extension call; build the mock query
+# payload once at import and assert on identity instead of equality
+_FOOBAR_AD = classad.classad.ClassAd({'foo': 'bar'})
+_MOCK_RESULT = [_FOOBAR_AD]
+_MOCK_JSON = {repr(htcondor.AdTypes.Startd): [{'foo': 'bar'}]}
 
-    for arg, expected in test_values.items():
-        assert camel_to_snake(arg) == expected
 
+def test_machine_constraint():
+    constraint = machine_constraint(['a.htc.inm7.de', 'b.htc.inm7.de'])
+    assert constraint == 'member(Machine, {"a.htc.inm7.de","b.htc.inm7.de"})'
 
-def test_snake_to_camel():
-    test_values = {
-        'foo_bar_baz': 'FooBarBaz', '_foo_bar_baz_': 'FooBarBaz',
-        'foo__bar_baz': 'FooBarBaz', 'FooBarBaz': 'Foobarbaz',
-        'FOOBARBAZ': 'Foobarbaz', 'foo1_bar2_baz3': 'Foo1Bar2Baz3',
-        '123': '123', '1_2_3': '123'}
+    # the constraint must evaluate as a set-membership test
+    expr = classad.ExprTree(constraint)
+    assert expr.eval(classad.ClassAd({'Machine': 'a.htc.inm7.de'}))
+    assert not expr.eval(classad.ClassAd({'Machine': 'c.htc.inm7.de'}))
 
-    for arg, expected in test_values.items():
-        assert snake_to_camel(arg) == expected
 
+@pytest.fixture(scope='module')
+def startd_collector():
+    # the collector is cheap to reset per test through its setters, so
+    # one instance serves the whole module
+    return ClassAdCollector(ad_type=htcondor.AdTypes.Startd)
 
-def test_translate_classad():
-    ad = {'foo': 1, 'bar_baz': 'foo'}
-    assert isinstance(translate_classad(ad, func=snake_to_camel), dict)
 
-    # Regular classad
-    ad = {'foo': 1, 'bar_baz': 'foo'}
-    ad_t = {'Foo': 1, 'BarBaz': 'foo'}
-    assert translate_classad(ad, func=snake_to_camel) == ad_t
+def test_classad_collector_constraint(startd_collector):
+    startd_collector.constraint = 'some constraint'
+    startd_collector.constraint_or('other constraint')
+    assert startd_collector.constraint == \
+        'some constraint || other constraint'
 
-    # Multilevel classad
-    ad = {'foo': 1, 'bar_baz': {'grue_grue': 2, 'baz_grue': 3}}
-    ad_t = {'Foo': 1, 'BarBaz': {'GrueGrue': 2, 'BazGrue': 3}}
-    assert translate_classad(ad, func=snake_to_camel) == ad_t
+    startd_collector.constraint = 'some constraint'
+    startd_collector.constraint_and('other constraint')
+    assert startd_collector.constraint == \
+        'some constraint && other constraint'
 
-    # Int-as-Key classad
-    ad = {'foo': 1, 1: 2, '2': 3, 4: 5}
-    ad_t = {'Foo': 1, 1: 2, '2': 3, 4: 5}
-    assert translate_classad(ad, func=snake_to_camel) == ad_t
+    # a clause that is already present is not appended again
+    startd_collector.constraint_and('other constraint')
+    assert startd_collector.constraint == \
+        'some constraint && other constraint'
 
-    # dict hidden in list classad
-    ad = {'one_two_THREE': [{'foo_bar': 1, 'bar_foo': {1: 'a_a', 'a_a': 1}}]}
-    ad_t = {'OneTwoThree': [{'FooBar': 1, 'BarFoo': {1: 'a_a', 'AA': 1}}]}
-    assert translate_classad(ad, func=snake_to_camel) == ad_t
 
+def test_classad_collector_projection(startd_collector):
+    startd_collector.projection = ['some', 'projection']
+    assert startd_collector.projection == ['some', 'projection']
 
-def test_classad_collector(monkeypatch):
+    # fetching without a projection is refused; the collector would
+    # return every attribute of every matching ad
+    startd_collector.projection = []
+    pytest.raises(ValueError, startd_collector.fetch)
+
+
+def test_classad_collector_fetch(startd_collector, monkeypatch):
     def mock_query(*args, **kwargs):
-        return [classad.classad.ClassAd({'foo': 'bar'})]
+        return _MOCK_RESULT
 
-    collector = ClassAdCollector(ad_type=htcondor.AdTypes.Startd)
+    monkeypatch.setattr(htcondor.Collector, 'query', mock_query)
+    utils.invalidate_query_cache()
+    startd_collector.constraint = 'SlotType != "Dynamic"'
+    startd_collector.projection = ['some', 'projection']
+    startd_collector.fetch()
+    assert startd_collector._classads is _MOCK_RESULT
+
+    # json (dict) conversion test
+    assert startd_collector.json_classads == _MOCK_JSON
 
-    # Constraint test
-    collector.constraint = 'some constraint'
-    collector.constraint_or('other constraint')
-    assert collector.constraint == 'some constraint || other constraint'
 
-    collector.constraint = 'some constraint'
-    collector.constraint_and('other constraint')
-    assert collector.constraint == 'some constraint && other constraint'
+def test_classad_collector_query_cache(monkeypatch):
+    calls = []
 
-    # Projection test
-    collector.projection = ['some', 'projection']
-    assert collector.projection == ['some', 'projection']
+    def mock_query(*args, **kwargs):
+        calls.append(kwargs)
+        return _MOCK_RESULT
 
     monkeypatch.setattr(htcondor.Collector, 'query', mock_query)
-    collector.constraint = 'some constraint'
-    collector.projection = ['some', 'projection']
-    collector.fetch()
-    assert collector._classads == [classad.classad.ClassAd({'foo': 'bar'})]
+    utils.invalidate_query_cache()
 
-    # json (dict) conversion test
-    expected_json = {repr(collector._ad_type): [{'foo': 'bar'}]}
-    assert collector.json_classads == expected_json
+    collector = ClassAdCollector(ad_type=htcondor.AdTypes.Startd)
+    collector.fetch(projection=['Machine'])
+    collector.fetch(projection=['Machine'])
+    assert len(calls) == 1  # the second fetch is served from the cache
+
+    # max_age=0 bypasses the cache
+    collector.fetch(projection=['Machine'], max_age=0)
+    assert len(calls) == 2